@@ -4,22 +4,107 @@ Physical Therapy Exercise Recommendation Backend
 Provides intelligent exercise recommendations based on user profile and external exercise database
 """
 
+import os
 import json
-import requests
+import hmac
+import time
+import signal
+import hashlib
+import threading
+from functools import lru_cache
 import logging
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass, asdict
-from flask import Flask, request, jsonify
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Sequence, Tuple, Union
+from dataclasses import dataclass
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
 import numpy as np
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import re
 
+from similarity import SimilarityIndex
+from search import SearchIndex, SearchResult, tokenize
+from program import select_diverse
+from progress_store import StoreBusy, get_store, session_row, assessment_row, parse_timestamp
+from exercise_store import EXERCISE_FIELDS, ExerciseStore, ExerciseView
+from shared_catalog import export_shared_catalog, load_shared_catalog, prune_artifacts, publish_version, published_version
+from cache import ResponseCache
+from metrics import registry, stage, should_profile, start_profile, finish_profile
+from serialization import JSON_BACKEND, encode_array, encode_record, encode_object
+from catalog import (
+    CatalogDelta, CatalogSnapshot, load_snapshot, refresh_snapshot, get_snapshot_path,
+    compute_exercise_hash, diff_catalogs
+)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Suitability ranges on the 1-10 scale, keyed by exercise intensity or category
+PAIN_RANGES = {
+    'very-low': {'min': 8, 'max': 10, 'optimal': [9, 10]},
+    'low': {'min': 5, 'max': 10, 'optimal': [6, 7, 8]},
+    'moderate': {'min': 2, 'max': 7, 'optimal': [3, 4, 5]},
+    'high': {'min': 1, 'max': 4, 'optimal': [1, 2, 3]},
+    'very-high': {'min': 1, 'max': 2, 'optimal': [1]}
+}
+
+MOBILITY_RANGES_BY_CATEGORY = {
+    'stretching': {'min': 1, 'max': 10, 'optimal': [2, 3, 4, 5]},
+    'mobility': {'min': 1, 'max': 10, 'optimal': [2, 3, 4, 5]},
+    'flexibility': {'min': 1, 'max': 10, 'optimal': [2, 3, 4, 5]},
+    'balance': {'min': 3, 'max': 10, 'optimal': [4, 5, 6, 7]},
+    'strength': {'min': 4, 'max': 10, 'optimal': [5, 6, 7, 8]},
+    'cardio': {'min': 6, 'max': 10, 'optimal': [7, 8, 9, 10]}
+}
+
+MOBILITY_RANGES_BY_INTENSITY = {
+    'very-low': {'min': 1, 'max': 10, 'optimal': [2, 3, 4]},
+    'low': {'min': 2, 'max': 10, 'optimal': [3, 4, 5]},
+    'moderate': {'min': 4, 'max': 10, 'optimal': [5, 6, 7]},
+    'high': {'min': 6, 'max': 10, 'optimal': [7, 8, 9]},
+    'very-high': {'min': 8, 'max': 10, 'optimal': [9, 10]}
+}
+
+DEFAULT_RANGE = {'min': 1, 'max': 10, 'optimal': [5]}
+
+# Categories treated as stretching work
+STRETCHING_CATEGORIES = ('stretching', 'flexibility', 'mobility')
+
+# Upper bound on postings kept per term in the similarity index (0 keeps all, i.e. exact scoring)
+SIMILARITY_MAX_POSTINGS = int(os.environ.get('SIMILARITY_MAX_POSTINGS', 0))
+
+# Distinct condition/goal texts whose similarity vectors are kept per catalog
+SIMILARITY_CACHE_SIZE = 1024
+
+# Similarity above which the match is called out in the reasons
+SIMILARITY_REASON_THRESHOLD = 0.2
+
+# Scores below this are reported as contraindicated and never recommended
+CONTRAINDICATED_BELOW = 0.3
+
+# Reloads reuse the previous engine's work for unchanged exercises unless CATALOG_INCREMENTAL_RELOAD=0
+INCREMENTAL_RELOAD = os.environ.get('CATALOG_INCREMENTAL_RELOAD', '1').lower() not in ('0', 'false', 'no')
+
+# Seconds between checks for a catalog version published to SHARED_CATALOG_DIR by another worker's reload; 0 disables
+CATALOG_SYNC_INTERVAL = float(os.environ.get('CATALOG_SYNC_INTERVAL', 1.0))
+
+# Catalog versions kept under SHARED_CATALOG_DIR; older artifact directories are deleted when a version is published
+SHARED_CATALOG_KEEP = int(os.environ.get('SHARED_CATALOG_KEEP', 2))
+
+# Incremental reloads keep the fitted TF-IDF vocabulary until tokens it has never seen add up to
+# this share of the fitted corpus; past that the model is refit from scratch
+VOCABULARY_DRIFT_THRESHOLD = float(os.environ.get('VOCABULARY_DRIFT_THRESHOLD', 0.05))
+
+# Effort points per intensity; a program day's points must stay within its intensity budget
+INTENSITY_POINTS = {'very-low': 1, 'low': 2, 'moderate': 3, 'high': 4, 'very-high': 5}
+
+# Weight given to variety over score when picking a program day (0 ranks by score alone, within the intensity budget)
+PROGRAM_DIVERSITY = float(os.environ.get('PROGRAM_DIVERSITY', 0.3))
+
+# Best-scoring candidates a program is selected from
+PROGRAM_CANDIDATE_POOL = int(os.environ.get('PROGRAM_CANDIDATE_POOL', 200))
+
 app = Flask(__name__)
 CORS(app)
 
@@ -44,33 +129,197 @@ class UserProfile:
     condition: str
     goals: List[str]
 
+@dataclass
+class ExerciseFeatures:
+    """User-independent exercise attributes, computed once per catalog load"""
+    intensity: str
+    pain_range: Dict[str, Any]
+    mobility_range: Dict[str, Any]
+    benefits: List[str]
+    muscles_lower: Tuple[str, ...]
+
+@dataclass
+class ScoreArrays:
+    """Column view of the feature table used by the vectorized scorer"""
+    pain_min: np.ndarray
+    pain_max: np.ndarray
+    pain_optimal: np.ndarray  # bit n set when level n is optimal
+    mobility_min: np.ndarray
+    mobility_max: np.ndarray
+    mobility_optimal: np.ndarray
+    benefit_score: np.ndarray
+    muscles: np.ndarray  # rows x muscle_vocab boolean matrix
+    muscle_vocab: List[str]
+
+    @classmethod
+    def from_features(cls, features: List[ExerciseFeatures]) -> 'ScoreArrays':
+        muscle_vocab = sorted({m for f in features for m in f.muscles_lower})
+        muscle_columns = {m: j for j, m in enumerate(muscle_vocab)}
+        muscles = np.zeros((len(features), len(muscle_vocab)), dtype=bool)
+        for i, f in enumerate(features):
+            for m in f.muscles_lower:
+                muscles[i, muscle_columns[m]] = True
+        
+        return cls(
+            pain_min=np.array([f.pain_range['min'] for f in features], dtype=np.int8),
+            pain_max=np.array([f.pain_range['max'] for f in features], dtype=np.int8),
+            pain_optimal=np.array([_level_mask(f.pain_range['optimal']) for f in features], dtype=np.uint16),
+            mobility_min=np.array([f.mobility_range['min'] for f in features], dtype=np.int8),
+            mobility_max=np.array([f.mobility_range['max'] for f in features], dtype=np.int8),
+            mobility_optimal=np.array([_level_mask(f.mobility_range['optimal']) for f in features], dtype=np.uint16),
+            benefit_score=np.array([min(len(f.benefits) * 0.2, 1.0) for f in features], dtype=np.float64),
+            muscles=muscles,
+            muscle_vocab=muscle_vocab
+        )
+
+    @classmethod
+    def updated(cls, previous: 'ScoreArrays', features: List[ExerciseFeatures], reused_new: np.ndarray,
+                reused_old: np.ndarray, fresh: List[int]) -> 'ScoreArrays':
+        """Arrays for `features`, copying reused rows from `previous` and computing only the `fresh` rows.
+        
+        The muscle vocabulary only grows: a muscle no row mentions any more keeps an all-False column.
+        """
+        fresh = np.asarray(fresh, dtype=np.intp)
+        computed = cls.from_features([features[i] for i in fresh])
+        muscle_vocab = sorted(set(previous.muscle_vocab).union(computed.muscle_vocab))
+        muscle_columns = {m: j for j, m in enumerate(muscle_vocab)}
+        muscles = np.zeros((len(features), len(muscle_vocab)), dtype=bool)
+        for source, rows, columns in ((previous.muscles[reused_old], reused_new, previous.muscle_vocab),
+                                      (computed.muscles, fresh, computed.muscle_vocab)):
+            muscles[np.ix_(rows, np.array([muscle_columns[m] for m in columns], dtype=np.intp))] = source
+        
+        def column(name: str) -> np.ndarray:
+            values = np.empty(len(features), dtype=getattr(previous, name).dtype)
+            values[reused_new] = getattr(previous, name)[reused_old]
+            values[fresh] = getattr(computed, name)
+            return values
+        
+        return cls(
+            **{name: column(name) for name in ('pain_min', 'pain_max', 'pain_optimal', 'mobility_min',
+                                              'mobility_max', 'mobility_optimal', 'benefit_score')},
+            muscles=muscles,
+            muscle_vocab=muscle_vocab
+        )
+
+def _level_mask(levels: List[int]) -> int:
+    mask = 0
+    for level in levels:
+        mask |= 1 << level
+    return mask
+
+def _level_bits(masks: np.ndarray, levels: np.ndarray) -> np.ndarray:
+    """(users x rows) matrix of whether each user's level is set in each row's mask"""
+    valid = (levels >= 0) & (levels < 16)
+    shifted = masks.astype(np.int64) >> np.where(valid, levels, 0)
+    return valid & ((shifted & 1) != 0)
+
+def _round_scores(raw_scores: np.ndarray) -> np.ndarray:
+    """Round like round(score, 2); the distinct raw scores are few, so map each through Python's round"""
+    if len(raw_scores) == 0:
+        return raw_scores
+    unique, inverse = np.unique(raw_scores, return_inverse=True)
+    return np.array([round(float(v), 2) for v in unique])[inverse]
+
+def _top_k_order(scores: np.ndarray, limit: int) -> np.ndarray:
+    """Indices of the `limit` highest scores, ordered like a stable descending sort"""
+    n = len(scores)
+    if isinstance(limit, (int, np.integer)) and 0 <= limit < n:
+        if limit == 0:
+            return np.empty(0, dtype=np.intp)
+        threshold = np.partition(-scores, limit - 1)[limit - 1]
+        candidates = np.flatnonzero(-scores <= threshold)
+        return candidates[np.lexsort((candidates, -scores[candidates]))][:limit]
+    
+    # Unusual limits keep plain list slicing semantics
+    order = np.lexsort((np.arange(n), -scores))
+    return np.asarray(list(order)[:limit], dtype=np.intp)
+
+def _pretokenized(tokens: List[str]) -> List[str]:
+    """Analyzer for documents that were already run through the vectorizer's own analyzer"""
+    return tokens
+
+@dataclass
+class VocabularyState:
+    """Terms the TF-IDF model was fitted on, and the unseen-token drift accumulated since"""
+    terms: frozenset
+    token_count: int
+    drift: float = 0.0
+
+@dataclass
+class CatalogViews:
+    """Precomputed index views over one catalog version"""
+    version: Optional[str]
+    pt_positions: np.ndarray
+    pt_exercises: List[ExerciseView]
+    stretching_positions: np.ndarray
+    by_category: Dict[str, np.ndarray]  # PT-relevant positions keyed by lowercased category
+
 @dataclass
 class RecommendationScore:
-    exercise: Exercise
+    exercise: ExerciseView
     score: float
     reasons: List[str]
     warnings: List[str]
     suitability: str
 
+@dataclass
+class ProgramDay:
+    day: int
+    exercises: List[RecommendationScore]
+    stretches: List[RecommendationScore]
+    intensity_load: int
+    intensity_budget: float
+
 class ExerciseRecommendationEngine:
-    def __init__(self):
-        self.exercises: List[Exercise] = []
+    def __init__(self, snapshot_path: Optional[str] = None, refresh: bool = False,
+                 shared_dir: Optional[str] = None, previous: Optional['ExerciseRecommendationEngine'] = None):
+        self.exercises: ExerciseStore = ExerciseStore()
         self.vectorizer = TfidfVectorizer(max_features=1000, stop_words='english')
         self.exercise_vectors = None
-        self.load_exercises()
-    
-    def load_exercises(self):
-        """Load exercises from external API"""
+        self.features: List[ExerciseFeatures] = []
+        self._position_by_id: Dict[str, int] = {}
+        self.similarity_index: Optional[SimilarityIndex] = None
+        self._query_similarity = None
+        self.score_arrays: Optional[ScoreArrays] = None
+        self._views: Optional[CatalogViews] = None
+        self.search_index: Optional[SearchIndex] = None
+        self.exercise_json: Sequence[bytes] = []
+        self.snapshot_path = snapshot_path or get_snapshot_path()
+        self.shared_dir = shared_dir or os.environ.get('SHARED_CATALOG_DIR') or None
+        self.catalog: Optional[CatalogSnapshot] = None
+        self.row_hashes: List[bytes] = []
+        self._vocabulary: Optional[VocabularyState] = None
+        self.ingest_stats: Dict[str, Any] = {}
+        self.load_exercises(refresh=refresh, previous=previous)
+
+    @property
+    def catalog_version(self) -> Optional[str]:
+        return self.catalog.version if self.catalog else None
+
+    def load_exercises(self, refresh: bool = False, previous: Optional['ExerciseRecommendationEngine'] = None):
+        """Load exercises from the local catalog snapshot, optionally refreshing it from the external API first.
+        
+        With a `previous` engine, derived data for exercises whose content did not change is reused.
+        """
         try:
-            logger.info("Loading exercises from external API...")
-            response = requests.get('https://raw.githubusercontent.com/yuhonas/free-exercise-db/main/dist/exercises.json')
-            response.raise_for_status()
-            
-            raw_exercises = response.json()
-            logger.info(f"Loaded {len(raw_exercises)} exercises from API")
+            snapshot = None
+            if refresh:
+                try:
+                    snapshot = refresh_snapshot(self.snapshot_path)
+                except Exception as e:
+                    logger.warning(f"Catalog refresh failed, falling back to local snapshot: {e}")
+
+            if snapshot is None:
+                logger.info(f"Loading exercises from snapshot {self.snapshot_path}...")
+                with stage('load_snapshot'):
+                    snapshot = load_snapshot(self.snapshot_path)
+
+            raw_exercises = snapshot.exercises
+            logger.info(f"Loaded {len(raw_exercises)} exercises from catalog {snapshot.version}")
             
-            # Convert to our Exercise dataclass
-            self.exercises = []
+            # Convert to our Exercise dataclass, then pack the rows into the columnar store
+            parsed: List[Exercise] = []
+            row_hashes: List[bytes] = []
             for ex in raw_exercises:
                 try:
                     exercise = Exercise(
@@ -86,43 +335,325 @@ class ExerciseRecommendationEngine:
                         category=ex.get('category', 'general'),
                         images=ex.get('images', [])
                     )
-                    self.exercises.append(exercise)
+                    parsed.append(exercise)
+                    row_hashes.append(compute_exercise_hash([getattr(exercise, field) for field in EXERCISE_FIELDS]))
                 except Exception as e:
                     logger.warning(f"Failed to parse exercise {ex.get('id', 'unknown')}: {e}")
                     continue
             
+            with stage('build_store'):
+                self.exercises = ExerciseStore(parsed)
+            self.row_hashes = row_hashes
             logger.info(f"Successfully parsed {len(self.exercises)} exercises")
-            self._prepare_vectors()
+            self.catalog = snapshot
+            self._views = None
+            delta = self._ingest_delta(previous) if previous is not None else None
+            if delta is None:
+                self._prepare_all()
+            with stage('build_views'):
+                self._views = self._build_views()
+            with stage('build_search_index'):
+                if delta is None or previous.search_index is None:
+                    self.search_index = SearchIndex.from_store(self.exercises, self._views.pt_positions)
+                else:
+                    previous_rows = np.full(len(self.exercises), -1, dtype=np.int64)
+                    previous_rows[list(delta.unchanged)] = list(delta.unchanged.values())
+                    self.search_index = SearchIndex.updated(previous.search_index, self.exercises,
+                                                            self._views.pt_positions, previous_rows)
             
         except Exception as e:
             logger.error(f"Failed to load exercises: {e}")
             raise
     
+    def _prepare_all(self):
+        """Build every derived structure from scratch, or attach shared artifacts for this version"""
+        with stage('prepare_features'):
+            self._prepare_features()
+        attached = False
+        if self.shared_dir:
+            with stage('attach_shared_catalog'):
+                attached = self._attach_shared_catalog()
+        if not attached:
+            with stage('prepare_fragments'):
+                self._prepare_fragments()
+            with stage('prepare_vectors'):
+                self._prepare_vectors()
+            if self.shared_dir:
+                with stage('export_shared_catalog'):
+                    self._export_shared_catalog()
+        self.ingest_stats = {'mode': 'full', 'exercises': len(self.exercises)}
+    
+    def _ingest_delta(self, previous: 'ExerciseRecommendationEngine') -> Optional[CatalogDelta]:
+        """Derive features, fragments and vectors from `previous`, recomputing only added or changed rows.
+        
+        Unchanged rows keep their feature row, score-array row, JSON fragment and TF-IDF row; new
+        text is transformed with the previous, frozen vocabulary. Returns the delta, or None without
+        touching the engine when a full build is needed instead: nothing to reuse, or vocabulary
+        drift past VOCABULARY_DRIFT_THRESHOLD.
+        """
+        vocabulary = previous._vocabulary
+        if previous.exercise_vectors is None or previous.score_arrays is None or vocabulary is None:
+            return None
+        
+        with stage('diff_catalog'):
+            delta = diff_catalogs(previous.exercises.ids, previous.row_hashes, self.exercises.ids, self.row_hashes)
+            fresh = delta.fresh
+            fresh_texts = [self._exercise_text(self.exercises[i]) for i in fresh]
+            
+            analyzer = previous.vectorizer.build_analyzer()
+            unseen = sum(1 for text in fresh_texts for token in analyzer(text) if token not in vocabulary.terms)
+            drift = vocabulary.drift + unseen / max(vocabulary.token_count, 1)
+        
+        if drift > VOCABULARY_DRIFT_THRESHOLD:
+            logger.info(f"Vocabulary drift {drift:.3f} exceeds {VOCABULARY_DRIFT_THRESHOLD}, refitting TF-IDF from scratch")
+            return None
+        
+        reused_new = np.fromiter(delta.unchanged.keys(), dtype=np.intp, count=len(delta.unchanged))
+        reused_old = np.fromiter(delta.unchanged.values(), dtype=np.intp, count=len(delta.unchanged))
+        
+        with stage('prepare_features'):
+            features: List[Optional[ExerciseFeatures]] = [None] * len(self.exercises)
+            for new, old in delta.unchanged.items():
+                features[new] = previous.features[old]
+            for i in fresh:
+                features[i] = self._compute_features(self.exercises[i])
+            self.features = features
+            self._position_by_id = {ex_id: i for i, ex_id in enumerate(self.exercises.ids)}
+            self.score_arrays = ScoreArrays.updated(previous.score_arrays, features, reused_new, reused_old, fresh)
+        
+        with stage('prepare_fragments'):
+            fragments: List[Optional[bytes]] = [None] * len(self.exercises)
+            for new, old in delta.unchanged.items():
+                fragments[new] = previous.exercise_json[old]
+            for i in fresh:
+                fragments[i] = encode_record(self.exercises[i])
+            self.exercise_json = fragments
+        
+        with stage('prepare_vectors'):
+            parts = [previous.exercise_vectors[reused_old]]
+            if fresh:
+                parts.append(previous.vectorizer.transform(fresh_texts))
+            stacked = sparse.vstack(parts, format='csr')
+            
+            # Put reused and freshly transformed rows back in catalog order
+            order = np.empty(len(self.exercises), dtype=np.intp)
+            order[reused_new] = np.arange(len(reused_new))
+            order[fresh] = len(reused_new) + np.arange(len(fresh))
+            self.exercise_vectors = stacked[order]
+            self.vectorizer = previous.vectorizer
+            self.similarity_index = SimilarityIndex(self.exercise_vectors, max_postings=SIMILARITY_MAX_POSTINGS)
+            self._query_similarity = lru_cache(maxsize=SIMILARITY_CACHE_SIZE)(self._compute_query_similarity)
+        
+        self._vocabulary = VocabularyState(vocabulary.terms, vocabulary.token_count, drift)
+        if self.shared_dir:
+            with stage('export_shared_catalog'):
+                self._export_shared_catalog()
+        
+        self.ingest_stats = {
+            'mode': 'incremental',
+            'exercises': len(self.exercises),
+            'added': len(delta.added),
+            'changed': len(delta.changed),
+            'removed': delta.removed,
+            'reused': len(delta.unchanged),
+            'vocabulary_drift': round(drift, 4)
+        }
+        logger.info(f"Ingested catalog delta: {self.ingest_stats}")
+        return delta
+    
+    def _prepare_features(self):
+        """Precompute the per-exercise feature table read by the scorer"""
+        self.features = [self._compute_features(ex) for ex in self.exercises]
+        self._index_features()
+        logger.info(f"Prepared feature table for {len(self.features)} exercises")
+    
+    def _index_features(self):
+        self._position_by_id = {ex.id: i for i, ex in enumerate(self.exercises)}
+        self.score_arrays = ScoreArrays.from_features(self.features)
+    
+    def _compute_features(self, exercise: Exercise) -> ExerciseFeatures:
+        intensity = self.calculate_intensity(exercise)
+        return ExerciseFeatures(
+            intensity=intensity,
+            pain_range=self._pain_range(intensity),
+            mobility_range=self._mobility_range(exercise, intensity),
+            benefits=self.get_therapeutic_benefits(exercise),
+            muscles_lower=tuple(m.lower() for m in exercise.primaryMuscles + exercise.secondaryMuscles)
+        )
+    
+    def _position_of(self, exercise: Union[Exercise, ExerciseView]) -> Optional[int]:
+        """Catalog row of an exercise: a view of this store is its own row (ids may repeat), anything else is looked up by id"""
+        if isinstance(exercise, ExerciseView) and exercise.store is self.exercises:
+            return exercise.position
+        return self._position_by_id.get(exercise.id)
+    
+    def get_features(self, exercise: Union[Exercise, ExerciseView]) -> ExerciseFeatures:
+        """Feature row for a catalog exercise, computed on the fly for anything outside the catalog"""
+        position = self._position_of(exercise)
+        if position is None:
+            return self._compute_features(exercise)
+        return self.features[position]
+    
+    def _prepare_fragments(self):
+        """Serialize every exercise to JSON bytes once so responses can splice them in"""
+        self.exercise_json = [encode_record(ex) for ex in self.exercises]
+        logger.info(f"Pre-serialized {len(self.exercise_json)} exercises with {JSON_BACKEND}")
+    
+    def get_exercise_json(self, exercise: Union[Exercise, ExerciseView]) -> bytes:
+        """Encoded JSON for a catalog exercise, encoded on the fly for anything outside the catalog"""
+        position = self._position_of(exercise)
+        if position is None:
+            return encode_record(exercise)
+        return self.exercise_json[position]
+    
     def _prepare_vectors(self):
         """Prepare TF-IDF vectors for similarity matching"""
         try:
-            # Create text representations of exercises
-            exercise_texts = []
-            for ex in self.exercises:
-                text_parts = [
-                    ex.name,
-                    ex.category or '',
-                    ex.equipment or '',
-                    ' '.join(ex.primaryMuscles),
-                    ' '.join(ex.secondaryMuscles),
-                    ' '.join(ex.instructions)
-                ]
-                exercise_texts.append(' '.join(text_parts).lower())
+            # Tokenize once: the tokens give the fitted vocabulary state and are fed straight to the fit
+            analyzer = self.vectorizer.build_analyzer()
+            exercise_tokens = [analyzer(self._exercise_text(ex)) for ex in self.exercises]
+            self._vocabulary = VocabularyState(frozenset(t for tokens in exercise_tokens for t in tokens),
+                                               sum(len(tokens) for tokens in exercise_tokens))
             
-            self.exercise_vectors = self.vectorizer.fit_transform(exercise_texts)
+            # This vectorizer is private to the engine being built, so swapping its analyzer is safe
+            params = self.vectorizer.get_params()
+            self.vectorizer.set_params(analyzer=_pretokenized, stop_words=None)
+            try:
+                self.exercise_vectors = self.vectorizer.fit_transform(exercise_tokens)
+            finally:
+                self.vectorizer.set_params(analyzer=params['analyzer'], stop_words=params['stop_words'])
+            self.similarity_index = SimilarityIndex(self.exercise_vectors, max_postings=SIMILARITY_MAX_POSTINGS)
+            self._query_similarity = lru_cache(maxsize=SIMILARITY_CACHE_SIZE)(self._compute_query_similarity)
             logger.info("Prepared TF-IDF vectors for exercise matching")
             
         except Exception as e:
             logger.error(f"Failed to prepare vectors: {e}")
             raise
     
-    def filter_pt_relevant(self) -> List[Exercise]:
-        """Filter exercises for physical therapy relevance"""
+    def _exercise_text(self, exercise: Exercise) -> str:
+        """Text representation of an exercise for TF-IDF matching"""
+        text_parts = [
+            exercise.name,
+            exercise.category or '',
+            exercise.equipment or '',
+            ' '.join(exercise.primaryMuscles),
+            ' '.join(exercise.secondaryMuscles),
+            ' '.join(exercise.instructions)
+        ]
+        return ' '.join(text_parts).lower()
+    
+    def _attach_shared_catalog(self) -> bool:
+        """Use memory-mapped fragments, vectors and postings exported for this catalog version, if any"""
+        try:
+            shared = load_shared_catalog(self.shared_dir, self.catalog_version, SIMILARITY_MAX_POSTINGS)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable shared catalog artifacts: {e}")
+            return False
+        
+        if shared is None or len(shared.fragments) != len(self.exercises):
+            return False
+        
+        self.exercise_json = shared.fragments
+        self.exercise_vectors = shared.vectors
+        self.similarity_index = shared.similarity_index
+        self.vectorizer = shared.vectorizer
+        self._vocabulary = VocabularyState(frozenset(shared.vocabulary['terms']), shared.vocabulary['token_count'],
+                                           shared.vocabulary['drift'])
+        self._query_similarity = lru_cache(maxsize=SIMILARITY_CACHE_SIZE)(self._compute_query_similarity)
+        return True
+    
+    def _export_shared_catalog(self):
+        """Publish this catalog's artifacts and switch to the memory-mapped copies"""
+        try:
+            export_shared_catalog(self.shared_dir, self.catalog_version, self.exercise_json,
+                                  self.exercise_vectors, self.similarity_index, self.vectorizer,
+                                  {'terms': self._vocabulary.terms, 'token_count': self._vocabulary.token_count,
+                                   'drift': self._vocabulary.drift})
+        except Exception as e:
+            logger.warning(f"Failed to export shared catalog artifacts, keeping private copies: {e}")
+            return
+        self._attach_shared_catalog()
+    
+    @property
+    def views(self) -> 'CatalogViews':
+        """Index views for the current catalog version, rebuilt only when the catalog changes"""
+        views = self._views
+        if views is None or views.version != self.catalog_version:
+            views = self._build_views()
+            self._views = views
+        return views
+    
+    def _build_views(self) -> 'CatalogViews':
+        pt_positions = self._pt_relevant_positions()
+        stretching_positions = self._stretching_positions(pt_positions)
+        
+        store = self.exercises
+        category_codes = store.codes['category'][pt_positions]
+        by_category: Dict[str, np.ndarray] = {}
+        for code, category in enumerate(store.vocabularies['category']):
+            positions = pt_positions[category_codes == code]
+            if len(positions):
+                key = category.lower() if category else ''
+                by_category[key] = np.union1d(by_category[key], positions) if key in by_category else positions
+        
+        views = CatalogViews(
+            version=self.catalog_version,
+            pt_positions=pt_positions,
+            pt_exercises=[store[i] for i in pt_positions],
+            stretching_positions=stretching_positions,
+            by_category=by_category
+        )
+        logger.info(f"Filtered to {len(views.pt_exercises)} PT-relevant exercises from {len(self.exercises)} total")
+        return views
+    
+    def query_text(self, user: UserProfile) -> str:
+        """Free text describing what the user is looking for: their condition plus their goals"""
+        goals = user.goals if isinstance(user.goals, list) else [user.goals]
+        return ' '.join([user.condition] + [str(g) for g in goals if g]).lower()
+    
+    def text_similarity(self, text: str) -> np.ndarray:
+        """Cosine similarity between the text and every exercise, cached per distinct text"""
+        return self._query_similarity(text)
+    
+    def similarity_cache_info(self):
+        """lru_cache statistics for the per-text similarity cache, or None before vectors are prepared"""
+        return self._query_similarity.cache_info() if self._query_similarity is not None else None
+    
+    def _compute_query_similarity(self, text: str) -> np.ndarray:
+        query = self.vectorizer.transform([text])
+        similarity = np.minimum(self.similarity_index.dense_scores(query), 1.0)
+        similarity.setflags(write=False)
+        return similarity
+    
+    def filter_pt_relevant(self) -> List[ExerciseView]:
+        """Filter exercises for physical therapy relevance (cached per catalog version; do not mutate)"""
+        return self.views.pt_exercises
+    
+    def find_pt_positions(self, filters: Dict[str, List[str]]) -> np.ndarray:
+        """PT-relevant positions matching every filter, in catalog order.
+        
+        `filters` maps a field (category, equipment, level, muscle) to accepted values;
+        values within a field are OR-ed, fields are AND-ed. Matching compares the store's
+        integer codes and muscle bitmasks rather than strings.
+        """
+        store = self.exercises
+        positions = self.views.pt_positions
+        for field, values in filters.items():
+            if field == 'muscle':
+                mask = store.muscle_mask(values)
+                keep = (store.primary_mask[positions] & mask).any(axis=1)
+            else:
+                keep = np.isin(store.codes[field][positions], store.codes_for(field, values))
+            positions = positions[keep]
+        return positions
+    
+    def count_stretching_categories(self) -> int:
+        """Number of PT-relevant exercises whose category is stretching, flexibility or mobility"""
+        by_category = self.views.by_category
+        return sum(len(by_category.get(c, ())) for c in STRETCHING_CATEGORIES)
+    
+    def _pt_relevant_positions(self) -> np.ndarray:
+        """Catalog positions of the PT-relevant exercises, in catalog order"""
         pt_categories = {
             'strength', 'stretching', 'cardio', 'plyometrics', 
             'strongman', 'olympic weightlifting', 'powerlifting'
@@ -138,23 +669,34 @@ class ExerciseRecommendationEngine:
             'machine', 'leverage machine', 'sled machine', 'stepmill machine'
         }
         
-        filtered = []
-        for ex in self.exercises:
-            # Check category
-            if ex.category and ex.category.lower() not in pt_categories:
-                continue
-            
-            # Check equipment
-            if ex.equipment:
-                if ex.equipment.lower() in excluded_equipment:
-                    continue
-                if ex.equipment.lower() not in pt_equipment:
-                    continue
-            
-            filtered.append(ex)
+        def category_ok(category) -> bool:
+            return not category or category.lower() in pt_categories
+        
+        def equipment_ok(equipment) -> bool:
+            if not equipment:
+                return True
+            return equipment.lower() not in excluded_equipment and equipment.lower() in pt_equipment
         
-        logger.info(f"Filtered to {len(filtered)} PT-relevant exercises from {len(self.exercises)} total")
-        return filtered
+        # Decide once per distinct value, then compare codes for every row
+        store = self.exercises
+        category_table = np.array([category_ok(v) for v in store.vocabularies['category']], dtype=bool)
+        equipment_table = np.array([equipment_ok(v) for v in store.vocabularies['equipment']], dtype=bool)
+        relevant = category_table[store.codes['category']] & equipment_table[store.codes['equipment']]
+        return np.flatnonzero(relevant)
+    
+    def _stretching_positions(self, pt_positions: np.ndarray) -> np.ndarray:
+        """Catalog positions of the PT-relevant stretching exercises"""
+        store = self.exercises
+        category_table = np.array([
+            bool(v) and v.lower() in STRETCHING_CATEGORIES for v in store.vocabularies['category']
+        ], dtype=bool)
+        
+        positions = []
+        for i in pt_positions:
+            if category_table[store.codes['category'][i]] or 'stretch' in store.names[i].lower():
+                positions.append(i)
+        
+        return np.asarray(positions, dtype=np.intp)
     
     def calculate_intensity(self, exercise: Exercise) -> str:
         """Calculate exercise intensity based on characteristics"""
@@ -198,55 +740,41 @@ class ExerciseRecommendationEngine:
     
     def get_pain_suitability(self, exercise: Exercise, user_pain: int) -> Dict[str, Any]:
         """Determine pain level suitability"""
-        intensity = self.calculate_intensity(exercise)
-        
-        intensity_ranges = {
-            'very-low': {'min': 8, 'max': 10, 'optimal': [9, 10]},
-            'low': {'min': 5, 'max': 10, 'optimal': [6, 7, 8]},
-            'moderate': {'min': 2, 'max': 7, 'optimal': [3, 4, 5]},
-            'high': {'min': 1, 'max': 4, 'optimal': [1, 2, 3]},
-            'very-high': {'min': 1, 'max': 2, 'optimal': [1]}
-        }
-        
-        return intensity_ranges.get(intensity, {'min': 1, 'max': 10, 'optimal': [5]})
+        return self.get_features(exercise).pain_range
+    
+    def _pain_range(self, intensity: str) -> Dict[str, Any]:
+        return PAIN_RANGES.get(intensity, DEFAULT_RANGE)
     
     def get_mobility_suitability(self, exercise: Exercise, user_mobility: int) -> Dict[str, Any]:
         """Determine mobility level suitability"""
-        intensity = self.calculate_intensity(exercise)
+        return self.get_features(exercise).mobility_range
+    
+    def _mobility_range(self, exercise: Exercise, intensity: str) -> Dict[str, Any]:
         category = exercise.category.lower() if exercise.category else ''
         
         # Special cases for mobility-focused exercises
-        if category in ['stretching', 'mobility', 'flexibility']:
-            return {'min': 1, 'max': 10, 'optimal': [2, 3, 4, 5]}
-        
-        if category == 'balance':
-            return {'min': 3, 'max': 10, 'optimal': [4, 5, 6, 7]}
-        
-        if category == 'strength':
-            return {'min': 4, 'max': 10, 'optimal': [5, 6, 7, 8]}
-        
-        if category == 'cardio':
-            return {'min': 6, 'max': 10, 'optimal': [7, 8, 9, 10]}
+        if category in MOBILITY_RANGES_BY_CATEGORY:
+            return MOBILITY_RANGES_BY_CATEGORY[category]
         
         # Default based on intensity
-        intensity_ranges = {
-            'very-low': {'min': 1, 'max': 10, 'optimal': [2, 3, 4]},
-            'low': {'min': 2, 'max': 10, 'optimal': [3, 4, 5]},
-            'moderate': {'min': 4, 'max': 10, 'optimal': [5, 6, 7]},
-            'high': {'min': 6, 'max': 10, 'optimal': [7, 8, 9]},
-            'very-high': {'min': 8, 'max': 10, 'optimal': [9, 10]}
-        }
-        
-        return intensity_ranges.get(intensity, {'min': 1, 'max': 10, 'optimal': [5]})
+        return MOBILITY_RANGES_BY_INTENSITY.get(intensity, DEFAULT_RANGE)
     
-    def calculate_recommendation_score(self, exercise: Exercise, user: UserProfile) -> RecommendationScore:
+    def calculate_recommendation_score(self, exercise: Union[Exercise, ExerciseView], user: UserProfile,
+                                       features: Optional[ExerciseFeatures] = None,
+                                       similarity: Optional[float] = None) -> RecommendationScore:
         """Calculate comprehensive recommendation score"""
+        if features is None:
+            features = self.get_features(exercise)
+        if similarity is None:
+            position = self._position_of(exercise)
+            similarity = 0.0 if position is None else float(self.text_similarity(self.query_text(user))[position])
+        
         reasons = []
         warnings = []
         score = 0.0
         
         # Pain level scoring (40% weight)
-        pain_suitability = self.get_pain_suitability(exercise, user.pain_level)
+        pain_suitability = features.pain_range
         if pain_suitability['min'] <= user.pain_level <= pain_suitability['max']:
             pain_score = 0.8
             reasons.append(f"Suitable for your pain level ({user.pain_level}/10)")
@@ -261,7 +789,7 @@ class ExerciseRecommendationEngine:
         score += pain_score * 0.4
         
         # Mobility level scoring (30% weight)
-        mobility_suitability = self.get_mobility_suitability(exercise, user.mobility_level)
+        mobility_suitability = features.mobility_range
         if mobility_suitability['min'] <= user.mobility_level <= mobility_suitability['max']:
             mobility_score = 0.8
             reasons.append(f"Appropriate for your mobility level ({user.mobility_level}/10)")
@@ -277,19 +805,25 @@ class ExerciseRecommendationEngine:
         
         # Condition matching (20% weight)
         condition_lower = user.condition.lower()
-        all_muscles = exercise.primaryMuscles + exercise.secondaryMuscles
         condition_score = 0.5  # Default neutral score
         
-        for muscle in all_muscles:
-            if condition_lower in muscle.lower() or muscle.lower() in condition_lower:
+        for muscle in features.muscles_lower:
+            if condition_lower in muscle or muscle in condition_lower:
                 condition_score = 1.0
                 reasons.append(f"Specifically targets your {user.condition} condition")
                 break
         
+        # Text similarity to the condition and goals can lift an otherwise neutral match
+        similarity_score = 0.5 + 0.5 * similarity
+        if similarity_score > condition_score:
+            condition_score = similarity_score
+            if similarity >= SIMILARITY_REASON_THRESHOLD:
+                reasons.append("Closely related to your condition and goals")
+        
         score += condition_score * 0.2
         
         # Therapeutic benefits (10% weight)
-        benefits = self.get_therapeutic_benefits(exercise)
+        benefits = features.benefits
         benefit_score = min(len(benefits) * 0.2, 1.0)
         if benefits:
             reasons.append(f"Provides {len(benefits)} therapeutic benefit{'s' if len(benefits) > 1 else ''}")
@@ -303,7 +837,7 @@ class ExerciseRecommendationEngine:
             suitability = 'good'
         elif score >= 0.5:
             suitability = 'moderate'
-        elif score >= 0.3:
+        elif score >= CONTRAINDICATED_BELOW:
             suitability = 'poor'
         else:
             suitability = 'contraindicated'
@@ -342,187 +876,1132 @@ class ExerciseRecommendationEngine:
         
         return benefits
     
+    def score_positions(self, positions: np.ndarray, user: UserProfile) -> np.ndarray:
+        """Vectorized equivalent of calculate_recommendation_score for the given catalog rows.
+        
+        Returns the unrounded scores; the arithmetic mirrors the scalar scorer step for step
+        so that both paths produce bit-identical floats.
+        """
+        return self.score_matrix(positions, [user])[0]
+    
+    def score_matrix(self, positions: np.ndarray, users: List[UserProfile]) -> np.ndarray:
+        """Unrounded scores for every user x row pair as a (len(users), len(positions)) matrix"""
+        arrays = self.score_arrays
+        pain_levels = np.array([u.pain_level for u in users], dtype=np.int64)[:, None]
+        mobility_levels = np.array([u.mobility_level for u in users], dtype=np.int64)[:, None]
+        
+        # Pain level scoring (40% weight)
+        pain_in_range = (arrays.pain_min[positions] <= pain_levels) & (pain_levels <= arrays.pain_max[positions])
+        pain_optimal = _level_bits(arrays.pain_optimal[positions], pain_levels)
+        pain_score = np.where(pain_in_range, np.where(pain_optimal, 1.0, 0.8), 0.1)
+        
+        # Mobility level scoring (30% weight)
+        mobility_in_range = (arrays.mobility_min[positions] <= mobility_levels) & (mobility_levels <= arrays.mobility_max[positions])
+        mobility_optimal = _level_bits(arrays.mobility_optimal[positions], mobility_levels)
+        mobility_score = np.where(mobility_in_range, np.where(mobility_optimal, 1.0, 0.8), 0.1)
+        
+        # Condition matching (20% weight), computed once per distinct condition
+        condition_rows = {}
+        for condition in {u.condition for u in users}:
+            condition_rows[condition] = self._condition_matches(positions, condition)
+        condition_match = np.array([condition_rows[u.condition] for u in users], dtype=bool).reshape(len(users), len(positions))
+        condition_score = np.where(condition_match, 1.0, 0.5)
+        
+        # Text similarity to the condition and goals, one sparse product per distinct text
+        similarity = np.array([self.text_similarity(self.query_text(u))[positions] for u in users]).reshape(len(users), len(positions))
+        condition_score = np.maximum(condition_score, 0.5 + 0.5 * similarity)
+        
+        score = pain_score * 0.4
+        score = score + mobility_score * 0.3
+        score = score + condition_score * 0.2
+        score = score + arrays.benefit_score[positions] * 0.1
+        return score
+    
+    def _condition_matches(self, positions: np.ndarray, condition: str) -> np.ndarray:
+        """Rows whose primary or secondary muscles overlap the condition text"""
+        condition_lower = condition.lower()
+        matched = [
+            j for j, muscle in enumerate(self.score_arrays.muscle_vocab)
+            if condition_lower in muscle or muscle in condition_lower
+        ]
+        if not matched:
+            return np.zeros(len(positions), dtype=bool)
+        return self.score_arrays.muscles[positions][:, matched].any(axis=1)
+    
+    def _rank_positions(self, positions: np.ndarray, user: UserProfile, limit: int) -> List[RecommendationScore]:
+        """Score the given rows, drop contraindicated ones and build results for the top `limit`"""
+        results = self._iter_ranked(positions, user, limit)
+        with stage('build_results'):
+            return list(results)
+    
+    def _iter_ranked(self, positions: np.ndarray, user: UserProfile, limit: int) -> Iterator[RecommendationScore]:
+        """Score and rank the given rows now; results for the top `limit` are built lazily as the iterator is consumed"""
+        positions = np.asarray(positions, dtype=np.intp)
+        with stage('score'):
+            raw_scores = self.score_positions(positions, user)
+        return self._iter_results(self._top_positions(positions, raw_scores, limit), user)
+    
+    def _select_top(self, positions: np.ndarray, raw_scores: np.ndarray, user: UserProfile,
+                    limit: int) -> List[RecommendationScore]:
+        top = self._top_positions(positions, raw_scores, limit)
+        with stage('build_results'):
+            return list(self._iter_results(top, user))
+    
+    def _top_positions(self, positions: np.ndarray, raw_scores: np.ndarray, limit: int) -> np.ndarray:
+        with stage('sort'):
+            # Filter out contraindicated exercises
+            safe = raw_scores >= CONTRAINDICATED_BELOW
+            positions = positions[safe]
+            scores = _round_scores(raw_scores[safe])
+            logger.debug(f"Filtered to {len(positions)} safe exercises")
+            
+            # Sort by rounded score (highest first), ties keep catalog order like a stable sort
+            return positions[_top_k_order(scores, limit)]
+    
+    def _iter_results(self, top: np.ndarray, user: UserProfile) -> Iterator[RecommendationScore]:
+        similarity = self.text_similarity(self.query_text(user))
+        for i in top:
+            yield self.calculate_recommendation_score(self.exercises[i], user, self.features[i], float(similarity[i]))
+    
+    def iter_batch_recommendations(self, users: List[UserProfile], limit: int = 10,
+                                   chunk_size: int = 256) -> Iterator[Tuple[int, List[RecommendationScore]]]:
+        """Yield (index, recommendations) for each user in input order.
+        
+        Identical profiles are scored once, and distinct profiles are scored together in chunks
+        as a profiles x exercises matrix over the PT-relevant rows.
+        """
+        positions = self.views.pt_positions
+        
+        # Group identical profiles, keeping the order of first appearance
+        group_of: List[int] = []
+        groups: Dict[tuple, int] = {}
+        unique_users: List[UserProfile] = []
+        for user in users:
+            key = (user.pain_level, user.mobility_level, user.condition, json.dumps(user.goals, sort_keys=True))
+            if key not in groups:
+                groups[key] = len(unique_users)
+                unique_users.append(user)
+            group_of.append(groups[key])
+        logger.info(f"Scoring batch of {len(users)} profiles ({len(unique_users)} distinct)")
+        
+        results: Dict[int, List[RecommendationScore]] = {}
+        for index, group in enumerate(group_of):
+            if group not in results:
+                chunk = unique_users[group:group + chunk_size]
+                with stage('score_batch'):
+                    raw_scores = self.score_matrix(positions, chunk)
+                for offset, user in enumerate(chunk):
+                    results[group + offset] = self._select_top(positions, raw_scores[offset], user, limit)
+            yield index, results[group]
+    
+    def get_batch_recommendations(self, users: List[UserProfile], limit: int = 10) -> List[List[RecommendationScore]]:
+        """Recommendations for many profiles at once, aligned with the input order"""
+        return [recommendations for _, recommendations in self.iter_batch_recommendations(users, limit)]
+    
     def get_recommendations(self, user: UserProfile, limit: int = 10) -> List[RecommendationScore]:
         """Get personalized exercise recommendations"""
         logger.info(f"Getting recommendations for user: pain={user.pain_level}, mobility={user.mobility_level}, condition={user.condition}")
         
         # Filter for PT-relevant exercises
-        pt_exercises = self.filter_pt_relevant()
-        logger.info(f"Using {len(pt_exercises)} PT-relevant exercises for recommendations")
-        
-        # Calculate scores for all exercises
-        scored_exercises = []
-        for exercise in pt_exercises:
-            score = self.calculate_recommendation_score(exercise, user)
-            scored_exercises.append(score)
-        
-        # Filter out contraindicated exercises
-        safe_exercises = [s for s in scored_exercises if s.suitability != 'contraindicated']
-        logger.info(f"Filtered to {len(safe_exercises)} safe exercises")
-        
-        # Sort by score (highest first)
-        safe_exercises.sort(key=lambda x: x.score, reverse=True)
+        with stage('filter_pt_relevant'):
+            pt_positions = self.views.pt_positions
+        logger.info(f"Using {len(pt_positions)} PT-relevant exercises for recommendations")
         
         # Return top recommendations
-        recommendations = safe_exercises[:limit]
+        recommendations = self._rank_positions(pt_positions, user, limit)
         logger.info(f"Returning {len(recommendations)} top recommendations")
         
         return recommendations
     
+    def iter_recommendations(self, user: UserProfile, limit: int = 10) -> Iterator[RecommendationScore]:
+        """Streaming form of get_recommendations: ranking happens now, results are built one at a time"""
+        with stage('filter_pt_relevant'):
+            pt_positions = self.views.pt_positions
+        return self._iter_ranked(pt_positions, user, limit)
+    
+    def iter_stretching_recommendations(self, user: UserProfile, limit: int = 8) -> Iterator[RecommendationScore]:
+        """Streaming form of get_stretching_recommendations"""
+        with stage('filter_stretching'):
+            stretching_positions = self.views.stretching_positions
+        return self._iter_ranked(stretching_positions, user, limit)
+    
     def get_stretching_recommendations(self, user: UserProfile, limit: int = 8) -> List[RecommendationScore]:
         """Get stretching-specific recommendations"""
-        pt_exercises = self.filter_pt_relevant()
+        with stage('filter_stretching'):
+            stretching_positions = self.views.stretching_positions
+        logger.info(f"Found {len(stretching_positions)} stretching exercises")
         
-        # Filter for stretching exercises
-        stretching_exercises = []
-        for ex in pt_exercises:
-            category = ex.category.lower() if ex.category else ''
-            name_lower = ex.name.lower()
+        return self._rank_positions(stretching_positions, user, limit)
+    
+    def intensity_budget(self, user: UserProfile, exercises_per_day: int) -> float:
+        """Daily intensity points: the average points of the intensities whose pain range covers the user's pain level"""
+        tolerated = [
+            points for intensity, points in INTENSITY_POINTS.items()
+            if PAIN_RANGES[intensity]['min'] <= user.pain_level <= PAIN_RANGES[intensity]['max']
+        ]
+        average = sum(tolerated) / len(tolerated) if tolerated else INTENSITY_POINTS['moderate']
+        return exercises_per_day * average
+    
+    def _program_pool(self, positions: np.ndarray, user: UserProfile) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The best safe candidates among positions, their raw scores and their pairwise TF-IDF cosine similarity"""
+        with stage('score'):
+            raw_scores = self.score_positions(positions, user)
+        safe = raw_scores >= CONTRAINDICATED_BELOW
+        positions, raw_scores = positions[safe], raw_scores[safe]
+        order = _top_k_order(_round_scores(raw_scores), PROGRAM_CANDIDATE_POOL)
+        pool = positions[order]
+        vectors = self.exercise_vectors[pool]
+        similarity = (vectors @ vectors.T).toarray()
+        return pool, raw_scores[order], similarity
+    
+    def _select_days(self, pool: np.ndarray, relevance: np.ndarray, similarity: np.ndarray, days: int,
+                     per_day: int, costs: Optional[np.ndarray] = None, budget: Optional[float] = None) -> List[List[int]]:
+        """Pool indices for each day. Days are filled with exercises not used yet; when too few of
+        those fit, only the missing slots are topped up from earlier days, preferring exercises
+        that were not in the previous day, and a day may stay short if nothing else fits."""
+        used = np.zeros(len(pool), dtype=bool)
+        previous = np.zeros(len(pool), dtype=bool)
+        selected = []
+        for _ in range(days):
+            picked = select_diverse(relevance, similarity, per_day, np.flatnonzero(~used),
+                                    diversity=PROGRAM_DIVERSITY, costs=costs, budget=budget)
+            if len(picked) < per_day and used.any():
+                for repeats in (used & ~previous, used):
+                    repeats = repeats.copy()
+                    repeats[picked] = False
+                    picked = select_diverse(relevance, similarity, per_day, np.flatnonzero(repeats),
+                                            diversity=PROGRAM_DIVERSITY, costs=costs, budget=budget, initial=picked)
+                    if len(picked) == per_day:
+                        break
+            used[picked] = True
+            previous[:] = False
+            previous[picked] = True
+            selected.append(picked)
+        return selected
+    
+    def build_program(self, user: UserProfile, days: int = 3, exercises_per_day: int = 5,
+                      stretches_per_day: int = 2) -> List[ProgramDay]:
+        """A multi-day plan: each day balances score against variety and stays within the daily intensity budget.
+        
+        Exercises come from the PT-relevant catalog minus stretching work, stretches from the
+        stretching view; stretches do not count against the budget.
+        """
+        views = self.views
+        exercise_positions = views.pt_positions[~np.isin(views.pt_positions, views.stretching_positions)]
+        budget = self.intensity_budget(user, exercises_per_day)
+        
+        pool, relevance, similarity = self._program_pool(exercise_positions, user)
+        costs = np.array([INTENSITY_POINTS.get(self.features[i].intensity, INTENSITY_POINTS['moderate']) for i in pool],
+                         dtype=np.float64)
+        stretch_pool, stretch_relevance, stretch_similarity = self._program_pool(views.stretching_positions, user)
+        
+        with stage('select_program'):
+            exercise_days = self._select_days(pool, relevance, similarity, days, exercises_per_day, costs, budget)
+            stretch_days = self._select_days(stretch_pool, stretch_relevance, stretch_similarity, days, stretches_per_day)
+        
+        with stage('build_results'):
+            query_similarity = self.text_similarity(self.query_text(user))
             
-            if category in ['stretching', 'flexibility', 'mobility'] or 'stretch' in name_lower:
-                stretching_exercises.append(ex)
-        
-        logger.info(f"Found {len(stretching_exercises)} stretching exercises")
-        
-        # Calculate scores
-        scored_exercises = []
-        for exercise in stretching_exercises:
-            score = self.calculate_recommendation_score(exercise, user)
-            scored_exercises.append(score)
-        
-        # Filter and sort
-        safe_exercises = [s for s in scored_exercises if s.suitability != 'contraindicated']
-        safe_exercises.sort(key=lambda x: x.score, reverse=True)
-        
-        return safe_exercises[:limit]
+            def results(positions: np.ndarray) -> List[RecommendationScore]:
+                return [
+                    self.calculate_recommendation_score(self.exercises[i], user, self.features[i], float(query_similarity[i]))
+                    for i in positions
+                ]
+            
+            return [
+                ProgramDay(
+                    day=day + 1,
+                    exercises=results(pool[picked]),
+                    stretches=results(stretch_pool[stretch_picked]),
+                    intensity_load=int(costs[picked].sum()),
+                    intensity_budget=budget
+                )
+                for day, (picked, stretch_picked) in enumerate(zip(exercise_days, stretch_days))
+            ]
+
+# Initialize the recommendation engine from the local snapshot; set
+# EXERCISE_CATALOG_REFRESH=1 to pull the remote catalog at boot instead.
+# The engine is treated as an immutable snapshot: reloads build a new one and
+# swap the module-level reference, so requests holding the old one finish on it.
+engine = ExerciseRecommendationEngine(
+    refresh=os.environ.get('EXERCISE_CATALOG_REFRESH', '').lower() in ('1', 'true', 'yes')
+)
+
+def current_engine() -> ExerciseRecommendationEngine:
+    """The engine snapshot to use for one request; read it once and keep using it"""
+    return engine
 
-# Initialize the recommendation engine
-engine = ExerciseRecommendationEngine()
+# Rendered /recommendations and /stretching bodies keyed on the normalized profile and catalog version
+response_cache = ResponseCache(
+    max_bytes=int(os.environ.get('RECOMMENDATION_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+    ttl_seconds=float(os.environ.get('RECOMMENDATION_CACHE_TTL', 0))
+)
+
+def profile_cache_key(kind: str, eng: ExerciseRecommendationEngine, user: UserProfile, limit: Any) -> tuple:
+    return (
+        kind,
+        eng.catalog_version,
+        user.pain_level,
+        user.mobility_level,
+        user.condition,
+        json.dumps(user.goals, sort_keys=True),
+        limit
+    )
+
+def _json_response(body: bytes, negotiated: bool = False):
+    """A JSON response; `negotiated` marks routes that answer NDJSON instead for some Accept headers"""
+    response = app.response_class(body, mimetype='application/json')
+    if negotiated:
+        response.vary.add('Accept')
+    return response
+
+def _encode_recommendation(rec: RecommendationScore, eng: ExerciseRecommendationEngine) -> bytes:
+    """Encode one result, splicing in the exercise's pre-serialized fragment"""
+    return encode_object(
+        {'exercise': eng.get_exercise_json(rec.exercise)},
+        {
+            'score': rec.score,
+            'reasons': rec.reasons,
+            'warnings': rec.warnings,
+            'suitability': rec.suitability
+        }
+    )
+
+def _encode_recommendations(recommendations: List[RecommendationScore], eng: ExerciseRecommendationEngine) -> bytes:
+    """Encode results as a JSON array"""
+    with stage('serialize'):
+        return encode_array([_encode_recommendation(rec, eng) for rec in recommendations])
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+def ndjson_lines(fragments: Iterable[bytes]) -> Iterator[bytes]:
+    """One already-encoded JSON value per line"""
+    for fragment in fragments:
+        yield fragment + b'\n'
+
+def iter_encoded_recommendations(recommendations: Iterable[RecommendationScore],
+                                 eng: ExerciseRecommendationEngine) -> Iterator[bytes]:
+    for rec in recommendations:
+        yield _encode_recommendation(rec, eng)
+
+def _wants_ndjson(data: Any = None) -> bool:
+    """Streaming NDJSON requested via ?stream=1, a "stream": true body field or Accept: application/x-ndjson"""
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    if isinstance(data, dict) and data.get('stream') is True:
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+def _ndjson_response(fragments: Iterable[bytes], headers: Optional[Dict[str, Any]] = None):
+    """Stream fragments as NDJSON; the body is produced lazily while it is being sent"""
+    response = app.response_class(ndjson_lines(fragments), mimetype=NDJSON_MIMETYPE,
+                                  headers={k: str(v) for k, v in (headers or {}).items()})
+    response.vary.add('Accept')
+    return response
+
+def recommendations_body(user: UserProfile, limit: Any, eng: ExerciseRecommendationEngine) -> bytes:
+    """Score and encode a /recommendations body, bypassing the response cache"""
+    recommendations = eng.get_recommendations(user, limit)
+    return encode_object(
+        {'recommendations': _encode_recommendations(recommendations, eng)},
+        {
+            'total_exercises': len(eng.exercises),
+            'pt_exercises': len(eng.filter_pt_relevant())
+        }
+    )
+
+def stretching_body(user: UserProfile, limit: Any, eng: ExerciseRecommendationEngine) -> bytes:
+    """Score and encode a /stretching body, bypassing the response cache"""
+    recommendations = eng.get_stretching_recommendations(user, limit)
+    return encode_object(
+        {'recommendations': _encode_recommendations(recommendations, eng)},
+        {'total_stretching_exercises': eng.count_stretching_categories()}
+    )
+
+def render_recommendations(user: UserProfile, limit: Any = 10,
+                           eng: Optional[ExerciseRecommendationEngine] = None) -> bytes:
+    """Encoded /recommendations body for a validated profile, served from the response cache when possible"""
+    eng = eng or current_engine()
+    return response_cache.get_or_compute(
+        profile_cache_key('recommendations', eng, user, limit),
+        lambda: recommendations_body(user, limit, eng)
+    )
+
+def render_stretching(user: UserProfile, limit: Any = 8,
+                      eng: Optional[ExerciseRecommendationEngine] = None) -> bytes:
+    """Encoded /stretching body, served from the response cache when possible"""
+    eng = eng or current_engine()
+    return response_cache.get_or_compute(
+        profile_cache_key('stretching', eng, user, limit),
+        lambda: stretching_body(user, limit, eng)
+    )
+
+def warm_response_cache(conditions: List[str], eng: Optional[ExerciseRecommendationEngine] = None):
+    """Precompute every pain x mobility combination for the given conditions at the default limits"""
+    eng = eng or current_engine()
+    for condition in conditions:
+        for pain_level in range(1, 11):
+            for mobility_level in range(1, 11):
+                user = UserProfile(pain_level=pain_level, mobility_level=mobility_level,
+                                   condition=condition, goals=[])
+                render_recommendations(user, eng=eng)
+                render_stretching(user, eng=eng)
+    logger.info(f"Warmed response cache for {len(conditions)} conditions: {response_cache.stats()}")
+
+# Comma-separated list of common conditions to precompute at boot, e.g. "back pain,knee pain"
+_warm_conditions = [c.strip() for c in os.environ.get('RECOMMENDATION_CACHE_WARM_CONDITIONS', '').split(',') if c.strip()]
+if _warm_conditions:
+    warm_response_cache(_warm_conditions)
+
+# Catalog reloads run one at a time in a background thread
+_reload_lock = threading.Lock()
+reload_status: Dict[str, Any] = {'state': 'idle', 'last_reload': None}
+catalog_reloads = registry.counter('pt_catalog_reloads_total', 'Catalog reloads by outcome', ('status',))
+
+def reload_engine(refresh: bool = False, incremental: bool = INCREMENTAL_RELOAD, publish: bool = True) -> Dict[str, Any]:
+    """Build a fresh engine snapshot (catalog, features, vectors, indexes) and swap it in atomically.
+    
+    Incremental reloads only recompute exercises that were added or changed since the current
+    engine. Requests that already hold the previous engine keep using it until they finish.
+    With `publish`, the new version is published for the other workers (see publish_catalog).
+    Returns timing and version details for the reload.
+    """
+    global engine
+    
+    with _reload_lock:
+        reload_status['state'] = 'running'
+        previous_version = engine.catalog_version
+        started = time.perf_counter()
+        try:
+            new_engine = ExerciseRecommendationEngine(snapshot_path=engine.snapshot_path, refresh=refresh,
+                                                      previous=engine if incremental else None)
+            build_ms = (time.perf_counter() - started) * 1000
+            
+            # Fill the response cache for the new version before any request sees it
+            if _warm_conditions:
+                warm_response_cache(_warm_conditions, new_engine)
+            
+            engine = new_engine
+            if publish:
+                publish_catalog(new_engine)
+            result = {
+                'status': 'ok',
+                'previous_version': previous_version,
+                'catalog_version': new_engine.catalog_version,
+                'exercises_loaded': len(new_engine.exercises),
+                'ingest': new_engine.ingest_stats,
+                'build_ms': round(build_ms, 1),
+                'total_ms': round((time.perf_counter() - started) * 1000, 1),
+                'finished_at': time.time()
+            }
+            logger.info(f"Reloaded catalog {previous_version} -> {new_engine.catalog_version} in {result['total_ms']}ms")
+        except Exception as e:
+            result = {
+                'status': 'error',
+                'error': str(e),
+                'previous_version': previous_version,
+                'total_ms': round((time.perf_counter() - started) * 1000, 1),
+                'finished_at': time.time()
+            }
+            logger.error(f"Catalog reload failed, keeping version {previous_version}: {e}")
+        
+        reload_status['state'] = 'idle'
+        reload_status['last_reload'] = result
+        catalog_reloads.inc(status=result['status'])
+        return result
+
+def start_reload(refresh: bool = False, incremental: bool = INCREMENTAL_RELOAD, publish: bool = True) -> bool:
+    """Start a background reload; returns False if one is already running"""
+    if _reload_lock.locked():
+        return False
+    threading.Thread(target=reload_engine, args=(refresh, incremental, publish), name='catalog-reload', daemon=True).start()
+    return True
+
+def publish_catalog(eng: ExerciseRecommendationEngine):
+    """Tell every worker sharing SHARED_CATALOG_DIR to serve this engine's catalog version, and delete old versions.
+    
+    A reload only swaps the engine of the process that runs it; the others pick the new
+    version up through sync_published_catalog.
+    """
+    if not eng.shared_dir:
+        return
+    try:
+        publish_version(eng.shared_dir, eng.catalog_version)
+        prune_artifacts(eng.shared_dir, SHARED_CATALOG_KEEP)
+    except OSError as e:
+        logger.warning(f"Failed to publish catalog version {eng.catalog_version}: {e}")
+
+_sync_state: Dict[str, Any] = {'checked_at': 0.0, 'attempted': None}
+
+def sync_published_catalog(wait: bool = False):
+    """Reload if another worker has published a catalog version this process is not serving.
+    
+    Checks at most every CATALOG_SYNC_INTERVAL seconds, or right away with `wait`, which also
+    blocks until the reload is done. The publishing worker saved the new catalog to the shared
+    snapshot file, so the reload reads it from there instead of refetching it.
+    """
+    eng = engine
+    now = time.monotonic()
+    if not eng.shared_dir:
+        return
+    if not wait and (CATALOG_SYNC_INTERVAL <= 0 or now - _sync_state['checked_at'] < CATALOG_SYNC_INTERVAL):
+        return
+    _sync_state['checked_at'] = now
+    
+    version = published_version(eng.shared_dir)
+    # Each published version is tried once, so a snapshot that does not match it cannot cause a reload loop
+    if version is None or version == eng.catalog_version or version == _sync_state['attempted']:
+        return
+    logger.info(f"Catalog version {version} was published by another worker, reloading from {eng.catalog_version}")
+    if wait:
+        _sync_state['attempted'] = version
+        reload_engine(publish=False)
+    elif start_reload(publish=False):
+        _sync_state['attempted'] = version
+
+# This process loaded the newest saved catalog, so other workers should serve it too
+publish_catalog(engine)
+
+def refresh_on_signal() -> bool:
+    """Whether signal-triggered reloads refetch the remote catalog (EXERCISE_CATALOG_REFRESH)"""
+    return os.environ.get('EXERCISE_CATALOG_REFRESH', '').lower() in ('1', 'true', 'yes')
+
+def _handle_reload_signal(signum, frame):
+    logger.info(f"Received signal {signum}, reloading exercise catalog")
+    start_reload(refresh=refresh_on_signal())
+
+def install_reload_signal():
+    """Reload on SIGHUP by default; CATALOG_RELOAD_SIGNAL can name another signal or "none".
+    
+    Runs at import. Under gunicorn the master's handler is replaced by the arbiter and each
+    worker resets its signals, so gunicorn.conf.py installs it again in every worker.
+    """
+    signal_name = os.environ.get('CATALOG_RELOAD_SIGNAL', 'SIGHUP')
+    if signal_name.lower() == 'none' or not hasattr(signal, signal_name):
+        return
+    try:
+        signal.signal(getattr(signal, signal_name), _handle_reload_signal)
+    except ValueError:
+        # Only the main thread may install signal handlers
+        logger.warning(f"Could not install {signal_name} catalog reload handler outside the main thread")
+
+install_reload_signal()
+
+def is_admin_token(token: str) -> bool:
+    """Whether token matches the configured ADMIN_TOKEN"""
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    # Compare bytes: compare_digest rejects str with non-ASCII characters
+    return bool(admin_token) and hmac.compare_digest(token.encode('utf-8'), admin_token.encode('utf-8'))
+
+def _is_admin_request() -> bool:
+    """Whether the request carries the configured ADMIN_TOKEN in its X-Admin-Token header"""
+    return is_admin_token(request.headers.get('X-Admin-Token', ''))
+
+@app.route('/admin/reload', methods=['GET', 'POST'])
+def admin_reload():
+    """Trigger a background catalog reload (POST) or report the last one (GET).
+    
+    Requires ADMIN_TOKEN to be configured and sent in the X-Admin-Token header.
+    POST body (optional): {"refresh": true} to refetch the remote catalog, {"wait": true} to block until done,
+    {"full": true} to rebuild everything instead of ingesting only the changed exercises.
+    """
+    if not _is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    eng = current_engine()
+    if request.method == 'GET':
+        return jsonify(dict(reload_status, catalog_version=eng.catalog_version))
+    
+    data = request.get_json(silent=True) or {}
+    refresh = data.get('refresh') is True
+    incremental = INCREMENTAL_RELOAD and data.get('full') is not True
+    
+    if data.get('wait') is True:
+        result = reload_engine(refresh=refresh, incremental=incremental)
+        return jsonify(result), 200 if result['status'] == 'ok' else 500
+    
+    if not start_reload(refresh=refresh, incremental=incremental):
+        return jsonify({'error': 'A reload is already running', 'catalog_version': eng.catalog_version}), 409
+    return jsonify({'status': 'started', 'catalog_version': eng.catalog_version}), 202
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
+    return jsonify(health_payload(current_engine()))
+
+def health_payload(eng: ExerciseRecommendationEngine) -> Dict[str, Any]:
+    return {
         'status': 'healthy',
-        'exercises_loaded': len(engine.exercises),
-        'pt_exercises': len(engine.filter_pt_relevant())
-    })
+        'exercises_loaded': len(eng.exercises),
+        'catalog_version': eng.catalog_version,
+        'pt_exercises': len(eng.filter_pt_relevant()),
+        'response_cache': response_cache.stats(),
+        'json_backend': JSON_BACKEND,
+        'last_reload': reload_status['last_reload']
+    }
+
+# Request counters and latency histograms by route, method and status
+http_requests = registry.counter(
+    'pt_http_requests_total', 'HTTP requests handled', ('route', 'method', 'status')
+)
+http_request_duration = registry.histogram(
+    'pt_http_request_duration_seconds', 'HTTP request latency until the response is returned', ('route', 'method', 'status')
+)
+
+@app.before_request
+def _sync_catalog():
+    sync_published_catalog()
+
+@app.before_request
+def _start_request_metrics():
+    if registry.enabled:
+        g.request_started = time.perf_counter()
+    
+    # Profile on demand (X-Profile: 1 with the admin token) or for a PROFILE_SAMPLE_RATE sample
+    requested = request.headers.get('X-Profile') == '1' and _is_admin_request()
+    if should_profile(requested):
+        g.profiler = start_profile()
+
+@app.after_request
+def _record_request_metrics(response):
+    # Streamed bodies are produced after this point, so their latency covers setup only
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        path = finish_profile(profiler, f'{request.method} {route}')
+        if path:
+            response.headers['X-Profile-Path'] = os.path.basename(path)
+    
+    started = g.pop('request_started', None)
+    if started is not None:
+        status = str(response.status_code)
+        http_requests.inc(route=route, method=request.method, status=status)
+        http_request_duration.observe(time.perf_counter() - started, route=route, method=request.method, status=status)
+    return response
+
+def _collect_app_metrics():
+    """Catalog, cache and reload gauges computed when /metrics is scraped"""
+    eng = current_engine()
+    yield ('pt_catalog_exercises', 'gauge', 'Exercises in the loaded catalog', {}, len(eng.exercises))
+    yield ('pt_catalog_pt_exercises', 'gauge', 'PT-relevant exercises in the loaded catalog', {}, len(eng.filter_pt_relevant()))
+    yield ('pt_catalog_info', 'gauge', 'Loaded catalog version and JSON backend',
+           {'version': eng.catalog_version or '', 'json_backend': JSON_BACKEND}, 1)
+    
+    stats = response_cache.stats()
+    for key in ('entries', 'bytes', 'max_bytes'):
+        yield (f'pt_response_cache_{key}', 'gauge', f'Response cache {key.replace("_", " ")}', {}, stats[key])
+    for key in ('hits', 'misses', 'evictions'):
+        yield (f'pt_response_cache_{key}_total', 'counter', f'Response cache {key}', {}, stats[key])
+    
+    store = get_store()
+    if store is not None:
+        yield ('pt_progress_queue_depth', 'gauge', 'Progress rows waiting to be written', {}, store.pending())
+    
+    similarity = eng.similarity_cache_info()
+    if similarity is not None:
+        yield ('pt_similarity_cache_entries', 'gauge', 'Cached query similarity vectors', {}, similarity.currsize)
+        yield ('pt_similarity_cache_hits_total', 'counter', 'Query similarity cache hits', {}, similarity.hits)
+        yield ('pt_similarity_cache_misses_total', 'counter', 'Query similarity cache misses', {}, similarity.misses)
+    
+    last_reload = reload_status['last_reload']
+    if last_reload:
+        yield ('pt_catalog_last_reload_seconds', 'gauge', 'Duration of the last catalog reload', {}, last_reload['total_ms'] / 1000)
+        yield ('pt_catalog_last_reload_success', 'gauge', 'Whether the last catalog reload succeeded', {}, int(last_reload['status'] == 'ok'))
+        yield ('pt_catalog_last_reload_timestamp_seconds', 'gauge', 'When the last catalog reload finished', {}, last_reload['finished_at'])
+
+registry.register_collector(_collect_app_metrics)
+
+@app.route('/metrics', methods=['GET'])
+def export_metrics():
+    """Request, stage, cache and catalog metrics in the Prometheus text format"""
+    if not registry.enabled:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return app.response_class(registry.render(), mimetype='text/plain; version=0.0.4')
+
+def parse_user_profile(data: Dict[str, Any], check_ranges: bool = True,
+                       recorded_levels: bool = False) -> Tuple[Optional[UserProfile], Optional[str]]:
+    """Build a UserProfile from a request payload, returning (profile, None) or (None, error message).
+    
+    With `recorded_levels` (only for requests carrying the admin token), a payload naming a
+    patient_id may leave out its levels; they are read from the progress store.
+    """
+    if not isinstance(data, dict):
+        return None, 'Profile must be a JSON object'
+    
+    if recorded_levels and data.get('patient_id') is not None and ('pain_level' not in data or 'mobility_level' not in data):
+        data = with_recorded_levels(data)
+    
+    # Validate input
+    required_fields = ['pain_level', 'mobility_level', 'condition']
+    for field in required_fields:
+        if field not in data:
+            return None, f'Missing required field: {field}'
+    
+    # Create user profile
+    user = UserProfile(
+        pain_level=int(data['pain_level']),
+        mobility_level=int(data['mobility_level']),
+        condition=data['condition'],
+        goals=data.get('goals', [])
+    )
+    
+    # Validate ranges
+    if check_ranges:
+        if not (1 <= user.pain_level <= 10):
+            return None, 'Pain level must be between 1 and 10'
+        
+        if not (1 <= user.mobility_level <= 10):
+            return None, 'Mobility level must be between 1 and 10'
+    
+    return user, None
+
+def with_recorded_levels(data: Dict[str, Any]) -> Dict[str, Any]:
+    """The payload with missing pain_level/mobility_level filled from the patient's recent progress"""
+    store = get_store()
+    if store is None:
+        return data
+    levels = store.recent_levels(str(data['patient_id']))
+    recorded = {field: value for field, value in levels.items() if value is not None and field not in data}
+    return dict(data, **recorded)
 
 @app.route('/recommendations', methods=['POST'])
 def get_recommendations():
     """Get personalized exercise recommendations"""
     try:
-        data = request.get_json()
-        
-        # Validate input
-        required_fields = ['pain_level', 'mobility_level', 'condition']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'Missing required field: {field}'}), 400
-        
-        # Create user profile
-        user = UserProfile(
-            pain_level=int(data['pain_level']),
-            mobility_level=int(data['mobility_level']),
-            condition=data['condition'],
-            goals=data.get('goals', [])
-        )
-        
-        # Validate ranges
-        if not (1 <= user.pain_level <= 10):
-            return jsonify({'error': 'Pain level must be between 1 and 10'}), 400
-        
-        if not (1 <= user.mobility_level <= 10):
-            return jsonify({'error': 'Mobility level must be between 1 and 10'}), 400
+        with stage('parse_request'):
+            data = request.get_json()
+            user, error = parse_user_profile(data, recorded_levels=_is_admin_request())
+        if error:
+            return jsonify({'error': error}), 400
         
         # Get recommendations
         limit = data.get('limit', 10)
-        recommendations = engine.get_recommendations(user, limit)
-        
-        # Convert to JSON-serializable format
-        result = []
-        for rec in recommendations:
-            result.append({
-                'exercise': asdict(rec.exercise),
-                'score': rec.score,
-                'reasons': rec.reasons,
-                'warnings': rec.warnings,
-                'suitability': rec.suitability
-            })
-        
-        return jsonify({
-            'recommendations': result,
-            'total_exercises': len(engine.exercises),
-            'pt_exercises': len(engine.filter_pt_relevant())
-        })
+        if _wants_ndjson(data):
+            # Streamed results skip the response cache; ranking happens here, results are built as they are sent
+            eng = current_engine()
+            recommendations = eng.iter_recommendations(user, limit)
+            return _ndjson_response(
+                iter_encoded_recommendations(recommendations, eng),
+                {'X-Total-Exercises': len(eng.exercises), 'X-PT-Exercises': len(eng.filter_pt_relevant())}
+            )
+        return _json_response(render_recommendations(user, limit), negotiated=True)
         
     except Exception as e:
         logger.error(f"Error getting recommendations: {e}")
         return jsonify({'error': str(e)}), 500
 
+# Upper bound on profiles per /recommendations/batch call
+MAX_BATCH_PROFILES = int(os.environ.get('MAX_BATCH_PROFILES', 1000))
+
+def parse_batch_request(data: Any, recorded_levels: bool = False) -> Tuple[Optional[List[UserProfile]], Any, Optional[str]]:
+    """Validate a /recommendations/batch payload, returning (profiles, limit, None) or (None, None, error message)"""
+    profiles = data.get('profiles') if isinstance(data, dict) else None
+    if not isinstance(profiles, list):
+        return None, None, 'Missing required field: profiles'
+    
+    if len(profiles) > MAX_BATCH_PROFILES:
+        return None, None, f'At most {MAX_BATCH_PROFILES} profiles per batch'
+    
+    users = []
+    with stage('parse_profiles'):
+        for index, profile in enumerate(profiles):
+            user, error = parse_user_profile(profile, recorded_levels=recorded_levels)
+            if error:
+                return None, None, f'Profile {index}: {error}'
+            users.append(user)
+    
+    limit = data.get('limit', 10)
+    if isinstance(limit, bool) or not isinstance(limit, int) or limit < 0:
+        return None, None, 'Limit must be a non-negative integer'
+    return users, limit, None
+
+def iter_encoded_batch(users: List[UserProfile], limit: int, eng: ExerciseRecommendationEngine) -> Iterator[bytes]:
+    """One encoded {"index", "recommendations"} object per profile, in input order"""
+    # Identical profiles share one result list, so encode each list once
+    encoded: Dict[int, bytes] = {}
+    for index, recommendations in eng.iter_batch_recommendations(users, limit):
+        key = id(recommendations)
+        if key not in encoded:
+            encoded[key] = _encode_recommendations(recommendations, eng)
+        yield encode_object({'recommendations': encoded[key]}, {'index': index})
+
+def batch_body(users: List[UserProfile], limit: int, eng: ExerciseRecommendationEngine) -> bytes:
+    return encode_object(
+        {'results': encode_array(iter_encoded_batch(users, limit, eng))},
+        {'total_profiles': len(users)}
+    )
+
+@app.route('/recommendations/batch', methods=['POST'])
+def get_batch_recommendations():
+    """Get recommendations for many profiles in one call.
+    
+    Body: {"profiles": [<profile>, ...], "limit": 10, "stream": false}. Identical profiles are
+    scored once. With "stream": true, ?stream=1 or an Accept: application/x-ndjson header,
+    results are streamed as one {"index", "recommendations"} JSON line per profile.
+    """
+    try:
+        with stage('parse_request'):
+            data = request.get_json()
+        users, limit, error = parse_batch_request(data, recorded_levels=_is_admin_request())
+        if error:
+            return jsonify({'error': error}), 400
+        
+        if _wants_ndjson(data):
+            return _ndjson_response(iter_encoded_batch(users, limit, current_engine()))
+        
+        return _json_response(batch_body(users, limit, current_engine()), negotiated=True)
+        
+    except Exception as e:
+        logger.error(f"Error getting batch recommendations: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/stretching', methods=['POST'])
 def get_stretching_recommendations():
     """Get stretching-specific recommendations"""
     try:
-        data = request.get_json()
-        
-        # Validate input
-        required_fields = ['pain_level', 'mobility_level', 'condition']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'Missing required field: {field}'}), 400
-        
-        # Create user profile
-        user = UserProfile(
-            pain_level=int(data['pain_level']),
-            mobility_level=int(data['mobility_level']),
-            condition=data['condition'],
-            goals=data.get('goals', [])
-        )
+        with stage('parse_request'):
+            data = request.get_json()
+            user, error = parse_user_profile(data, check_ranges=False, recorded_levels=_is_admin_request())
+        if error:
+            return jsonify({'error': error}), 400
         
         # Get stretching recommendations
         limit = data.get('limit', 8)
-        recommendations = engine.get_stretching_recommendations(user, limit)
-        
-        # Convert to JSON-serializable format
-        result = []
-        for rec in recommendations:
-            result.append({
-                'exercise': asdict(rec.exercise),
-                'score': rec.score,
-                'reasons': rec.reasons,
-                'warnings': rec.warnings,
-                'suitability': rec.suitability
-            })
-        
-        return jsonify({
-            'recommendations': result,
-            'total_stretching_exercises': len([ex for ex in engine.filter_pt_relevant() 
-                                             if ex.category and ex.category.lower() in ['stretching', 'flexibility', 'mobility']])
-        })
+        if _wants_ndjson(data):
+            eng = current_engine()
+            recommendations = eng.iter_stretching_recommendations(user, limit)
+            return _ndjson_response(
+                iter_encoded_recommendations(recommendations, eng),
+                {'X-Total-Stretching-Exercises': eng.count_stretching_categories()}
+            )
+        return _json_response(render_stretching(user, limit), negotiated=True)
         
     except Exception as e:
         logger.error(f"Error getting stretching recommendations: {e}")
         return jsonify({'error': str(e)}), 500
 
+# Upper bounds on the size of a /program plan
+MAX_PROGRAM_DAYS = int(os.environ.get('MAX_PROGRAM_DAYS', 14))
+MAX_PROGRAM_ITEMS_PER_DAY = 20
+
+def parse_program_options(data: Dict[str, Any]) -> Tuple[Optional[Tuple[int, int, int]], Optional[str]]:
+    """(days, exercises_per_day, stretches_per_day) from a /program body, or an error message"""
+    options = []
+    for field, default, low, high in (
+        ('days', 3, 1, MAX_PROGRAM_DAYS),
+        ('exercises_per_day', 5, 1, MAX_PROGRAM_ITEMS_PER_DAY),
+        ('stretches_per_day', 2, 0, MAX_PROGRAM_ITEMS_PER_DAY)
+    ):
+        value = data.get(field, default)
+        if isinstance(value, bool) or not isinstance(value, int) or not (low <= value <= high):
+            return None, f'{field} must be an integer between {low} and {high}'
+        options.append(value)
+    return tuple(options), None
+
+def program_body(user: UserProfile, options: Tuple[int, int, int], eng: ExerciseRecommendationEngine) -> bytes:
+    """Build and encode a /program body, bypassing the response cache"""
+    days = eng.build_program(user, *options)
+    with stage('serialize'):
+        encoded_days = encode_array(
+            encode_object(
+                {
+                    'exercises': encode_array(_encode_recommendation(rec, eng) for rec in day.exercises),
+                    'stretches': encode_array(_encode_recommendation(rec, eng) for rec in day.stretches)
+                },
+                {
+                    'day': day.day,
+                    'intensity_load': day.intensity_load,
+                    'intensity_budget': day.intensity_budget
+                }
+            )
+            for day in days
+        )
+        return encode_object({'days': encoded_days}, {'pt_exercises': len(eng.filter_pt_relevant())})
+
+def render_program(user: UserProfile, options: Tuple[int, int, int],
+                   eng: Optional[ExerciseRecommendationEngine] = None) -> bytes:
+    """Encoded /program body, served from the response cache when possible"""
+    eng = eng or current_engine()
+    return response_cache.get_or_compute(
+        profile_cache_key('program', eng, user, options),
+        lambda: program_body(user, options, eng)
+    )
+
+@app.route('/program', methods=['POST'])
+def get_program():
+    """Build a multi-day exercise program in one call.
+    
+    Body: a profile as for /recommendations plus optional "days" (default 3),
+    "exercises_per_day" (default 5) and "stretches_per_day" (default 2). Each day
+    trades score against variety, avoids repeating earlier days and keeps its summed
+    exercise intensity within a budget derived from the pain level.
+    """
+    try:
+        with stage('parse_request'):
+            data = request.get_json()
+            user, error = parse_user_profile(data, recorded_levels=_is_admin_request())
+            if not error:
+                options, error = parse_program_options(data)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        return _json_response(render_program(user, options))
+        
+    except Exception as e:
+        logger.error(f"Error building program: {e}")
+        return jsonify({'error': str(e)}), 500
+
+EXERCISE_FILTER_FIELDS = ('category', 'equipment', 'level', 'muscle')
+
+def parse_non_negative_int(value: Optional[str], default: Optional[int]) -> Optional[int]:
+    """Parse an optional query parameter, raising ValueError unless it is a non-negative integer"""
+    if value is None or value == '':
+        return default
+    parsed = int(value)
+    if parsed < 0:
+        raise ValueError
+    return parsed
+
+def exercise_page_etag(eng: ExerciseRecommendationEngine, filters: Dict[str, List[str]],
+                       offset: int, limit: Optional[int], ndjson: bool = False) -> str:
+    """Strong ETag for an /exercises page: the body only depends on the catalog, the encoder and the normalized query"""
+    query = json.dumps([
+        sorted((f, sorted(v.lower() for v in values)) for f, values in filters.items()),
+        offset,
+        limit
+    ])
+    fmt = '|ndjson' if ndjson else ''
+    return hashlib.sha1(f'{eng.catalog_version}|{JSON_BACKEND}|{query}{fmt}'.encode('utf-8')).hexdigest()
+
+def exercise_page(eng: ExerciseRecommendationEngine, filters: Dict[str, List[str]],
+                  offset: int, limit: Optional[int]) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """Positions of one filtered /exercises page plus its pagination fields"""
+    positions = eng.find_pt_positions(filters) if filters else eng.views.pt_positions
+    page = positions[offset:] if limit is None else positions[offset:offset + limit]
+    next_offset = offset + len(page)
+    return page, {
+        'total': len(positions),
+        'offset': offset,
+        'limit': limit,
+        'next_offset': next_offset if next_offset < len(positions) else None
+    }
+
+def exercise_page_body(eng: ExerciseRecommendationEngine, filters: Dict[str, List[str]],
+                       offset: int, limit: Optional[int]) -> bytes:
+    """Encoded /exercises body for one filtered page"""
+    page, pagination = exercise_page(eng, filters, offset, limit)
+    
+    # Splice the pre-serialized exercise fragments into the response
+    exercises = encode_array(eng.exercise_json[i] for i in page)
+    return encode_object({'exercises': exercises}, pagination)
+
+def exercise_page_headers(pagination: Dict[str, Any]) -> Dict[str, Any]:
+    """Pagination fields of a streamed /exercises page, sent as headers since the body is only exercises"""
+    headers = {'X-Total-Count': pagination['total']}
+    if pagination['next_offset'] is not None:
+        headers['X-Next-Offset'] = pagination['next_offset']
+    return headers
+
 @app.route('/exercises', methods=['GET'])
 def get_all_exercises():
-    """Get all PT-relevant exercises"""
+    """Get PT-relevant exercises, optionally filtered and paginated.
+    
+    Query params: category, equipment, level and muscle (repeatable, case-insensitive),
+    offset and limit. Responses carry a strong ETag so unchanged clients get 304. With
+    ?stream=1 or Accept: application/x-ndjson, exercises are streamed one per line and the
+    pagination fields move to X-Total-Count and X-Next-Offset headers.
+    """
     try:
-        pt_exercises = engine.filter_pt_relevant()
+        try:
+            offset = parse_non_negative_int(request.args.get('offset'), 0)
+            limit = parse_non_negative_int(request.args.get('limit'), None)
+        except ValueError:
+            return jsonify({'error': 'offset and limit must be non-negative integers'}), 400
+        
+        filters = {
+            field: request.args.getlist(field)
+            for field in EXERCISE_FILTER_FIELDS
+            if request.args.getlist(field)
+        }
         
-        # Convert to JSON-serializable format
-        exercises = [asdict(ex) for ex in pt_exercises]
+        eng = current_engine()
+        stream = _wants_ndjson()
+        etag = exercise_page_etag(eng, filters, offset, limit, ndjson=stream)
         
-        return jsonify({
-            'exercises': exercises,
-            'total': len(exercises)
-        })
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        elif stream:
+            page, pagination = exercise_page(eng, filters, offset, limit)
+            fragments = eng.exercise_json
+            response = _ndjson_response((fragments[i] for i in page), exercise_page_headers(pagination))
+        else:
+            response = _json_response(exercise_page_body(eng, filters, offset, limit))
+        
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.add('Accept')
+        return response
         
     except Exception as e:
         logger.error(f"Error getting exercises: {e}")
         return jsonify({'error': str(e)}), 500
 
+def search_cache_key(eng: ExerciseRecommendationEngine, query: str, filters: Dict[str, List[str]],
+                     offset: int, limit: Optional[int]) -> tuple:
+    """Queries that tokenize the same share a cache entry; a trailing space ends the prefix term"""
+    return (
+        'search',
+        eng.catalog_version,
+        tuple(tokenize(query)),
+        query[-1:].isspace(),
+        tuple(sorted((f, tuple(sorted(v.lower() for v in values))) for f, values in filters.items())),
+        offset,
+        limit
+    )
+
+def run_search(eng: ExerciseRecommendationEngine, query: str, filters: Dict[str, List[str]],
+               offset: int, limit: Optional[int]) -> SearchResult:
+    allowed = eng.find_pt_positions(filters) if filters else None
+    with stage('search'):
+        return eng.search_index.search(query, limit=limit, offset=offset, allowed=allowed)
+
+def search_body(eng: ExerciseRecommendationEngine, query: str, filters: Dict[str, List[str]],
+                offset: int, limit: Optional[int]) -> bytes:
+    """Encoded /search body without the query: ranked exercises with their BM25 scores, pagination and completions"""
+    result = run_search(eng, query, filters, offset, limit)
+    fragments = eng.exercise_json
+    with stage('serialize'):
+        results = encode_array(
+            encode_object({'exercise': fragments[position]}, {'score': round(float(score), 4)})
+            for position, score in zip(result.positions, result.scores)
+        )
+        next_offset = offset + len(result.positions)
+        return encode_object({'results': results}, {
+            'total': result.total,
+            'offset': offset,
+            'limit': limit,
+            'next_offset': next_offset if next_offset < result.total else None,
+            'suggestions': result.suggestions
+        })
+
+def render_search(eng: ExerciseRecommendationEngine, query: str, filters: Dict[str, List[str]],
+                  offset: int, limit: Optional[int]) -> bytes:
+    body = response_cache.get_or_compute(
+        search_cache_key(eng, query, filters, offset, limit),
+        lambda: search_body(eng, query, filters, offset, limit)
+    )
+    # The cached body is shared by queries that tokenize the same, so each response adds its own query
+    return body[:-1] + b',' + encode_object({}, {'query': query})[1:]
+
+@app.route('/search', methods=['GET'])
+def search_exercises():
+    """Full-text search over PT-relevant exercises, suitable for search-as-you-type.
+    
+    Query params: q (required), the /exercises filters, offset and limit (default 20).
+    Every term must match; unless q ends with a space its last term matches as a prefix,
+    and `suggestions` lists its most common completions.
+    """
+    try:
+        query = request.args.get('q', '')
+        if not query.strip():
+            return jsonify({'error': 'q is required'}), 400
+        
+        try:
+            offset = parse_non_negative_int(request.args.get('offset'), 0)
+            limit = parse_non_negative_int(request.args.get('limit'), 20)
+        except ValueError:
+            return jsonify({'error': 'offset and limit must be non-negative integers'}), 400
+        
+        filters = {
+            field: request.args.getlist(field)
+            for field in EXERCISE_FILTER_FIELDS
+            if request.args.getlist(field)
+        }
+        
+        return _json_response(render_search(current_engine(), query, filters, offset, limit))
+        
+    except Exception as e:
+        logger.error(f"Error searching exercises: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# Row builders per progress table; each validates one record from a request body
+PROGRESS_TABLES = {'sessions': session_row, 'assessments': assessment_row}
+
+# Most rows returned by one history query
+MAX_HISTORY_LIMIT = 1000
+
+def progress_rows(table: str, patient_id: str, data: Any) -> List[tuple]:
+    """Validated rows from one record, a list of records or {"<table>": [...]}, raising ValueError"""
+    if isinstance(data, dict) and isinstance(data.get(table), list):
+        data = data[table]
+    records = data if isinstance(data, list) else [data]
+    if not records:
+        raise ValueError(f'No {table} to record')
+    return [PROGRESS_TABLES[table](patient_id, record) for record in records]
+
+def parse_history_query(since: Optional[str], until: Optional[str], limit: Optional[str]) -> Tuple[Optional[float], Optional[float], int]:
+    """(since, until, limit) for a history query, raising ValueError on malformed values"""
+    return (
+        parse_timestamp(since) if since else None,
+        parse_timestamp(until) if until else None,
+        min(parse_non_negative_int(limit, 100), MAX_HISTORY_LIMIT)
+    )
+
+@app.route('/patients/<patient_id>/<table>', methods=['GET', 'POST'])
+def patient_progress(patient_id: str, table: str):
+    """Record (POST) or list (GET) a patient's sessions or assessments.
+    
+    POST takes one record, a list of records or {"<table>": [...]} and answers 202 once the
+    rows are queued; they are committed in the background within PROGRESS_FLUSH_INTERVAL.
+    GET returns the newest rows first; query params since and until (ISO 8601 or epoch
+    seconds) and limit (default 100).
+    """
+    store = get_store()
+    if store is None or table not in PROGRESS_TABLES:
+        return jsonify({'error': 'Not found'}), 404
+    if not _is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    try:
+        if request.method == 'POST':
+            try:
+                rows = progress_rows(table, patient_id, request.get_json(silent=True))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            store.record(table, rows)
+            return jsonify({'queued': len(rows)}), 202
+        
+        try:
+            since, until, limit = parse_history_query(
+                request.args.get('since'), request.args.get('until'), request.args.get('limit')
+            )
+        except ValueError:
+            return jsonify({'error': 'since and until must be timestamps and limit a non-negative integer'}), 400
+        with stage('progress_history'):
+            records = store.history(table, patient_id, since, until, limit)
+        return jsonify({'patient_id': patient_id, table: records, 'count': len(records)})
+        
+    except StoreBusy as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error serving {table} for patient {patient_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/patients/<patient_id>/levels', methods=['GET'])
+def patient_levels(patient_id: str):
+    """The pain and mobility levels recommendations use for this patient when a request leaves them out"""
+    store = get_store()
+    if store is None:
+        return jsonify({'error': 'Not found'}), 404
+    if not _is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    try:
+        return jsonify(dict(store.recent_levels(patient_id), patient_id=patient_id))
+    except Exception as e:
+        logger.error(f"Error reading levels for patient {patient_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
     logger.info("Starting Physical Therapy Exercise Recommendation Backend...")
     app.run(debug=True, host='0.0.0.0', port=5001)
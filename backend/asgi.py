@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""
+ASGI Serving Mode
+Serves the Flask app's routes (/health, /recommendations, /recommendations/batch, /stretching, /program, /exercises,
+/search, /patients, /admin/reload and /metrics) on an asyncio event loop
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5001
+
+Connections and request bodies are handled on the event loop, so slow clients only cost a coroutine.
+Scoring runs on a thread pool and catalog refreshes on their own thread, so neither blocks the loop.
+For more cores, run several worker processes (e.g. gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:app).
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import parse_qs
+
+import app as backend
+from metrics import registry, stage
+from progress_store import close_store
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# Threads scoring uncached profiles; numpy releases the GIL for the heavy array work
+SCORING_WORKERS = int(os.environ.get('ASGI_SCORING_WORKERS', os.cpu_count() or 4))
+
+# Largest request body accepted before answering 413
+MAX_BODY_BYTES = int(os.environ.get('ASGI_MAX_BODY_BYTES', 1024 * 1024))
+
+# Seconds between background catalog refreshes (fetch the remote catalog, rebuild, swap); 0 disables
+CATALOG_REFRESH_INTERVAL = float(os.environ.get('CATALOG_REFRESH_INTERVAL', 0))
+
+# Added to responses of routes that answer JSON or NDJSON depending on the Accept header
+VARY_ACCEPT = ('vary', 'Accept')
+
+# (status, body, content type, extra headers); an iterable body is streamed chunk by chunk
+Response = Tuple[int, Union[bytes, Iterable[bytes], 'ScoredStream'], str, List[Tuple[str, str]]]
+
+
+def _patient_path(path: str) -> Optional[Tuple[str, str]]:
+    """(patient_id, resource) for /patients/<patient_id>/<resource> paths"""
+    parts = path.split('/')
+    if len(parts) == 4 and parts[1] == 'patients' and parts[2] and parts[3]:
+        return parts[2], parts[3]
+    return None
+
+
+class ScoredStream:
+    """Streamed body whose fragments are scored while they are produced, so each is pulled on the scoring executor"""
+
+    def __init__(self, fragments: Iterable[bytes]):
+        self.fragments = fragments
+
+
+class RequestBodyTooLarge(Exception):
+    pass
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+def _json(status: int, payload: Any) -> Response:
+    return status, dumps(payload), 'application/json', []
+
+
+
+def _wants_ndjson(headers: Dict[str, str], args: Dict[str, List[str]], data: Any = None) -> bool:
+    """Same rules as the Flask app: ?stream=1, a "stream": true body field or Accept: application/x-ndjson"""
+    if args.get('stream', [''])[0].lower() in ('1', 'true', 'yes'):
+        return True
+    if isinstance(data, dict) and data.get('stream') is True:
+        return True
+
+    # Highest-quality media type wins, earlier entries break ties
+    best, best_quality = None, 0.0
+    for entry in headers.get('accept', '').split(','):
+        media_type, *params = [part.strip() for part in entry.split(';')]
+        quality = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if media_type and quality > best_quality:
+            best, best_quality = media_type.lower(), quality
+    return best == backend.NDJSON_MIMETYPE
+
+
+def _query_args(scope: Dict[str, Any]) -> Dict[str, List[str]]:
+    return parse_qs(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True)
+
+
+def _header_pairs(headers: Dict[str, Any]) -> List[Tuple[str, str]]:
+    return [(name.lower(), str(value)) for name, value in headers.items()]
+
+
+def _is_admin(headers: Dict[str, str]) -> bool:
+    """Whether the request carries the configured ADMIN_TOKEN in its X-Admin-Token header"""
+    return backend.is_admin_token(headers.get('x-admin-token', ''))
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Strong comparison of an If-None-Match header against an unquoted ETag"""
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate == f'"{etag}"':
+            return True
+    return False
+
+
+class AsyncRecommendationApp:
+    """ASGI application sharing the Flask app's engine, response cache, reloads and metrics"""
+
+    def __init__(self, scoring_workers: int = SCORING_WORKERS, refresh_interval: float = CATALOG_REFRESH_INTERVAL):
+        self.scoring_workers = scoring_workers
+        self.refresh_interval = refresh_interval
+        self._scoring_executor: Optional[ThreadPoolExecutor] = None
+        self._reload_executor: Optional[ThreadPoolExecutor] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.routes: Dict[str, Tuple[Tuple[str, ...], Callable[..., Awaitable[Response]]]] = {
+            '/health': (('GET',), self.health),
+            '/recommendations': (('POST',), self.recommendations),
+            '/recommendations/batch': (('POST',), self.batch_recommendations),
+            '/stretching': (('POST',), self.stretching),
+            '/program': (('POST',), self.program),
+            '/exercises': (('GET',), self.exercises),
+            '/search': (('GET',), self.search),
+            '/admin/reload': (('GET', 'POST'), self.admin_reload),
+            '/metrics': (('GET',), self.metrics)
+        }
+
+    @property
+    def scoring_executor(self) -> ThreadPoolExecutor:
+        if self._scoring_executor is None:
+            self._scoring_executor = ThreadPoolExecutor(max_workers=self.scoring_workers, thread_name_prefix='scoring')
+        return self._scoring_executor
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive: Callable, send: Callable):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def startup(self):
+        """Start the periodic catalog refresh, if configured"""
+        if self.refresh_interval > 0:
+            self._refresh_task = asyncio.get_running_loop().create_task(self._refresh_periodically())
+            logger.info(f"Refreshing the exercise catalog every {self.refresh_interval:g}s")
+
+    async def shutdown(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+        for executor in (self._scoring_executor, self._reload_executor):
+            if executor is not None:
+                executor.shutdown(wait=False)
+        close_store()
+
+    @property
+    def reload_executor(self) -> ThreadPoolExecutor:
+        if self._reload_executor is None:
+            self._reload_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='catalog-reload')
+        return self._reload_executor
+
+    async def refresh_catalog(self) -> Dict[str, Any]:
+        """Fetch the remote catalog and swap in a rebuilt engine without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.reload_executor, backend.reload_engine, True)
+
+    async def _refresh_periodically(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            result = await self.refresh_catalog()
+            if result['status'] != 'ok':
+                logger.warning(f"Scheduled catalog refresh failed: {result.get('error')}")
+
+    async def _http(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        started = time.perf_counter() if registry.enabled else None
+        backend.sync_published_catalog()
+        method = scope['method']
+        path = scope['path']
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope.get('headers', [])}
+        route = self.routes.get(path)
+        route_label = path
+        patient_path = _patient_path(path) if route is None else None
+        if patient_path is not None:
+            # The patient id is part of the path; the handler checks the method itself
+            route = ((method,), self.patients)
+            route_label = '/patients/<patient_id>/levels' if patient_path[1] == 'levels' else '/patients/<patient_id>/<table>'
+
+        try:
+            if method == 'OPTIONS':
+                response = self._preflight(headers)
+            elif route is None:
+                response = _json(404, {'error': 'Not found'})
+            elif method not in route[0] and not (method == 'HEAD' and 'GET' in route[0]):
+                response = _json(405, {'error': 'Method not allowed'})
+            else:
+                body = await self._read_body(receive) if method == 'POST' else b''
+                response = await route[1](scope, headers, body)
+        except RequestBodyTooLarge:
+            response = _json(413, {'error': f'Request body exceeds {MAX_BODY_BYTES} bytes'})
+        except ClientDisconnected:
+            return
+
+        status, payload, content_type, extra_headers = response
+        response_headers = [
+            (b'content-type', content_type.encode('latin-1')),
+            (b'access-control-allow-origin', b'*')
+        ] + [(name.encode('latin-1'), value.encode('latin-1')) for name, value in extra_headers]
+        streamed = not isinstance(payload, bytes)
+        if not streamed:
+            response_headers.append((b'content-length', str(len(payload)).encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+
+        if streamed and method != 'HEAD':
+            # Each chunk is produced only once the previous one has been handed to the server
+            if isinstance(payload, ScoredStream):
+                loop = asyncio.get_running_loop()
+                lines = backend.ndjson_lines(payload.fragments)
+                while True:
+                    chunk = await loop.run_in_executor(self.scoring_executor, next, lines, None)
+                    if chunk is None:
+                        break
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            else:
+                for chunk in backend.ndjson_lines(payload):
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        else:
+            await send({'type': 'http.response.body', 'body': b'' if method == 'HEAD' or streamed else payload})
+
+        if started is not None:
+            route_label = route_label if route is not None else 'unmatched'
+            backend.http_requests.inc(route=route_label, method=method, status=str(status))
+            backend.http_request_duration.observe(time.perf_counter() - started, route=route_label,
+                                                  method=method, status=str(status))
+
+    async def _read_body(self, receive: Callable) -> bytes:
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                raise ClientDisconnected()
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                raise RequestBodyTooLarge()
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    def _preflight(self, headers: Dict[str, str]) -> Response:
+        """CORS preflight answer matching Flask-CORS defaults"""
+        extra = [('access-control-allow-methods', 'GET, HEAD, POST, OPTIONS')]
+        requested = headers.get('access-control-request-headers')
+        if requested:
+            extra.append(('access-control-allow-headers', requested))
+        return 200, b'', 'text/plain', extra
+
+    async def health(self, scope, headers, body) -> Response:
+        return _json(200, backend.health_payload(backend.current_engine()))
+
+    async def metrics(self, scope, headers, body) -> Response:
+        if not registry.enabled:
+            return _json(404, {'error': 'Metrics are disabled'})
+        return 200, registry.render().encode('utf-8'), 'text/plain; version=0.0.4', []
+
+    async def recommendations(self, scope, headers, body) -> Response:
+        return await self._profile_response(scope, headers, body, 'recommendations', default_limit=10, check_ranges=True)
+
+    async def stretching(self, scope, headers, body) -> Response:
+        return await self._profile_response(scope, headers, body, 'stretching', default_limit=8, check_ranges=False)
+
+    async def _parse_profile(self, headers: Dict[str, str], data: Any,
+                             check_ranges: bool = True) -> Tuple[Optional[backend.UserProfile], Optional[str]]:
+        """parse_user_profile, moved to the executor when it reads a patient's levels from the progress store"""
+        recorded_levels = _is_admin(headers)
+        if recorded_levels and isinstance(data, dict) and data.get('patient_id') is not None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.scoring_executor, backend.parse_user_profile, data, check_ranges, True)
+        return backend.parse_user_profile(data, check_ranges)
+
+    async def program(self, scope, headers, body) -> Response:
+        try:
+            with stage('parse_request'):
+                try:
+                    data = json.loads(body) if body else None
+                except ValueError:
+                    return _json(400, {'error': 'Request body must be valid JSON'})
+                user, error = await self._parse_profile(headers, data)
+                if not error:
+                    options, error = backend.parse_program_options(data)
+            if error:
+                return _json(400, {'error': error})
+
+            eng = backend.current_engine()
+            key = backend.profile_cache_key('program', eng, user, options)
+            encoded = backend.response_cache.get(key)
+            if encoded is None:
+                loop = asyncio.get_running_loop()
+                encoded = await loop.run_in_executor(self.scoring_executor, backend.program_body, user, options, eng)
+                backend.response_cache.put(key, encoded)
+            return 200, encoded, 'application/json', []
+
+        except Exception as e:
+            logger.error(f"Error building program: {e}")
+            return _json(500, {'error': str(e)})
+
+    async def _profile_response(self, scope: Dict[str, Any], headers: Dict[str, str], body: bytes, kind: str,
+                                default_limit: int, check_ranges: bool) -> Response:
+        """Validate a profile, answer from the response cache, or score it on the executor"""
+        try:
+            with stage('parse_request'):
+                try:
+                    data = json.loads(body) if body else None
+                except ValueError:
+                    return _json(400, {'error': 'Request body must be valid JSON'})
+                user, error = await self._parse_profile(headers, data, check_ranges=check_ranges)
+            if error:
+                return _json(400, {'error': error})
+
+            limit = data.get('limit', default_limit)
+            eng = backend.current_engine()
+            loop = asyncio.get_running_loop()
+
+            if _wants_ndjson(headers, _query_args(scope), data):
+                # Rank on the executor, then score, build and send results one line at a time, also on the executor
+                if kind == 'recommendations':
+                    results = await loop.run_in_executor(self.scoring_executor, eng.iter_recommendations, user, limit)
+                    extra = {'X-Total-Exercises': len(eng.exercises), 'X-PT-Exercises': len(eng.filter_pt_relevant())}
+                else:
+                    results = await loop.run_in_executor(self.scoring_executor, eng.iter_stretching_recommendations, user, limit)
+                    extra = {'X-Total-Stretching-Exercises': eng.count_stretching_categories()}
+                return (200, ScoredStream(backend.iter_encoded_recommendations(results, eng)), backend.NDJSON_MIMETYPE,
+                        [VARY_ACCEPT] + _header_pairs(extra))
+
+            render = backend.recommendations_body if kind == 'recommendations' else backend.stretching_body
+            key = backend.profile_cache_key(kind, eng, user, limit)
+            encoded = backend.response_cache.get(key)
+            if encoded is None:
+                encoded = await loop.run_in_executor(self.scoring_executor, render, user, limit, eng)
+                backend.response_cache.put(key, encoded)
+            return 200, encoded, 'application/json', [VARY_ACCEPT]
+
+        except Exception as e:
+            logger.error(f"Error serving /{kind}: {e}")
+            return _json(500, {'error': str(e)})
+
+    async def batch_recommendations(self, scope, headers, body) -> Response:
+        try:
+            with stage('parse_request'):
+                try:
+                    data = json.loads(body) if body else None
+                except ValueError:
+                    return _json(400, {'error': 'Request body must be valid JSON'})
+            # Profiles with a patient_id read the progress store, so parsing runs on the executor too
+            loop = asyncio.get_running_loop()
+            users, limit, error = await loop.run_in_executor(self.scoring_executor, backend.parse_batch_request,
+                                                             data, _is_admin(headers))
+            if error:
+                return _json(400, {'error': error})
+
+            eng = backend.current_engine()
+            if _wants_ndjson(headers, _query_args(scope), data):
+                # Batches are scored in chunks while being encoded; each profile's line is sent once it is ready
+                return 200, ScoredStream(backend.iter_encoded_batch(users, limit, eng)), backend.NDJSON_MIMETYPE, [VARY_ACCEPT]
+            encoded = await loop.run_in_executor(self.scoring_executor, backend.batch_body, users, limit, eng)
+            return 200, encoded, 'application/json', [VARY_ACCEPT]
+
+        except Exception as e:
+            logger.error(f"Error getting batch recommendations: {e}")
+            return _json(500, {'error': str(e)})
+
+    async def exercises(self, scope, headers, body) -> Response:
+        try:
+            args = _query_args(scope)
+            try:
+                offset = backend.parse_non_negative_int(args.get('offset', [None])[0], 0)
+                limit = backend.parse_non_negative_int(args.get('limit', [None])[0], None)
+            except ValueError:
+                return _json(400, {'error': 'offset and limit must be non-negative integers'})
+
+            filters = {field: args[field] for field in backend.EXERCISE_FILTER_FIELDS if args.get(field)}
+            eng = backend.current_engine()
+            stream = _wants_ndjson(headers, args)
+            etag = backend.exercise_page_etag(eng, filters, offset, limit, ndjson=stream)
+            cache_headers = [('etag', f'"{etag}"'), ('cache-control', 'no-cache'), VARY_ACCEPT]
+
+            if _etag_matches(headers.get('if-none-match', ''), etag):
+                return 304, b'', 'application/json', cache_headers
+            if stream:
+                page, pagination = backend.exercise_page(eng, filters, offset, limit)
+                fragments = eng.exercise_json
+                extra = _header_pairs(backend.exercise_page_headers(pagination))
+                return 200, (fragments[i] for i in page), backend.NDJSON_MIMETYPE, cache_headers + extra
+            return 200, backend.exercise_page_body(eng, filters, offset, limit), 'application/json', cache_headers
+
+        except Exception as e:
+            logger.error(f"Error getting exercises: {e}")
+            return _json(500, {'error': str(e)})
+
+    async def search(self, scope, headers, body) -> Response:
+        # Queries only sum a few postings, so they are answered on the loop like /exercises pages
+        try:
+            args = _query_args(scope)
+            query = args.get('q', [''])[0]
+            if not query.strip():
+                return _json(400, {'error': 'q is required'})
+            try:
+                offset = backend.parse_non_negative_int(args.get('offset', [None])[0], 0)
+                limit = backend.parse_non_negative_int(args.get('limit', [None])[0], 20)
+            except ValueError:
+                return _json(400, {'error': 'offset and limit must be non-negative integers'})
+
+            filters = {field: args[field] for field in backend.EXERCISE_FILTER_FIELDS if args.get(field)}
+            return 200, backend.render_search(backend.current_engine(), query, filters, offset, limit), 'application/json', []
+
+        except Exception as e:
+            logger.error(f"Error searching exercises: {e}")
+            return _json(500, {'error': str(e)})
+
+    async def admin_reload(self, scope, headers, body) -> Response:
+        """Trigger a catalog reload (POST) or report the last one (GET); same body and ADMIN_TOKEN check as Flask"""
+        if not _is_admin(headers):
+            return _json(403, {'error': 'Forbidden'})
+
+        eng = backend.current_engine()
+        if scope['method'] in ('GET', 'HEAD'):
+            return _json(200, dict(backend.reload_status, catalog_version=eng.catalog_version))
+
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            data = None
+        data = data if isinstance(data, dict) else {}
+        refresh = data.get('refresh') is True
+        incremental = backend.INCREMENTAL_RELOAD and data.get('full') is not True
+
+        if data.get('wait') is True:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.reload_executor, backend.reload_engine, refresh, incremental)
+            return _json(200 if result['status'] == 'ok' else 500, result)
+
+        if not backend.start_reload(refresh=refresh, incremental=incremental):
+            return _json(409, {'error': 'A reload is already running', 'catalog_version': eng.catalog_version})
+        return _json(202, {'status': 'started', 'catalog_version': eng.catalog_version})
+
+    async def patients(self, scope, headers, body) -> Response:
+        """Record or read a patient's sessions and assessments, or their current levels"""
+        patient_id, resource = _patient_path(scope['path'])
+        method = scope['method']
+        store = backend.get_store()
+        if store is None or (resource != 'levels' and resource not in backend.PROGRESS_TABLES):
+            return _json(404, {'error': 'Not found'})
+        if method not in ('GET', 'HEAD') and (resource == 'levels' or method != 'POST'):
+            return _json(405, {'error': 'Method not allowed'})
+        if not _is_admin(headers):
+            return _json(403, {'error': 'Forbidden'})
+
+        try:
+            loop = asyncio.get_running_loop()
+            if resource == 'levels':
+                levels = await loop.run_in_executor(self.scoring_executor, store.recent_levels, patient_id)
+                return _json(200, dict(levels, patient_id=patient_id))
+
+            if method == 'POST':
+                try:
+                    data = json.loads(body) if body else None
+                except ValueError:
+                    data = None
+                try:
+                    rows = backend.progress_rows(resource, patient_id, data)
+                except ValueError as e:
+                    return _json(400, {'error': str(e)})
+                # Rows are only queued here; the store's writer thread commits them
+                store.record(resource, rows)
+                return _json(202, {'queued': len(rows)})
+
+            args = _query_args(scope)
+            try:
+                since, until, limit = backend.parse_history_query(
+                    args.get('since', [None])[0], args.get('until', [None])[0], args.get('limit', [None])[0]
+                )
+            except ValueError:
+                return _json(400, {'error': 'since and until must be timestamps and limit a non-negative integer'})
+            records = await loop.run_in_executor(self.scoring_executor, store.history, resource, patient_id, since, until, limit)
+            return _json(200, {'patient_id': patient_id, resource: records, 'count': len(records)})
+
+        except backend.StoreBusy as e:
+            return _json(503, {'error': str(e)})
+        except Exception as e:
+            logger.error(f"Error serving {resource} for patient {patient_id}: {e}")
+            return _json(500, {'error': str(e)})
+
+
+app = AsyncRecommendationApp()
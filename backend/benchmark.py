@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite
+Reproducible latency, throughput and allocation benchmarks for the recommendation engine and HTTP endpoints
+
+Runs against a deterministic synthetic catalog, so no network is needed:
+
+    python benchmark.py --output baseline.json
+    python benchmark.py --compare baseline.json --threshold 0.25
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import itertools
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_SCHEMA_VERSION = 1
+DEFAULT_CATALOG_SIZE = 873
+FIXTURE_SEED = 20240601
+# Benchmarks faster than this (ms) are reported but never flagged, timer noise dominates them
+NOISE_FLOOR_MS = 0.01
+GRID_CONDITIONS = ['back pain', 'knee pain', 'shoulder pain', 'hip mobility', 'neck stiffness']
+# Search-as-you-type queries: single prefixes, completed terms and multi-term prefixes
+SEARCH_QUERIES = ['s', 'ham', 'hamstring ', 'glute bri', 'lower back stre', 'shoulder', 'band']
+
+_NAME_WORDS = [
+    'Jump', 'Squat', 'Press', 'Stretch', 'Bridge', 'Plank', 'Lunge', 'Gentle', 'Walk', 'Curl',
+    'Row', 'Pull', 'Push', 'Step', 'Rotation', 'Raise', 'Hold', 'Kneeling', 'Seated', 'Lying',
+    'Side', 'Single-Leg', 'Cat', 'Hip', 'Shoulder', 'Mobility', 'Balance', 'Soft', 'Sprint',
+    'Cardio', 'Strength', 'Deadlift', 'Slow', 'Breathing', 'Passive'
+]
+_CATEGORIES = ['strength', 'stretching', 'cardio', 'plyometrics', 'strongman', 'olympic weightlifting', 'powerlifting']
+_EQUIPMENT = [None, 'body only', 'dumbbell', 'barbell', 'cable', 'machine', 'kettlebells', 'bands',
+              'foam roll', 'medicine ball', 'exercise ball', 'e-z curl bar', 'other']
+_LEVELS = ['beginner', 'intermediate', 'expert']
+_FORCES = [None, 'push', 'pull', 'static']
+_MECHANICS = [None, 'compound', 'isolation']
+_MUSCLES = ['abdominals', 'abductors', 'adductors', 'biceps', 'calves', 'chest', 'forearms', 'glutes',
+            'hamstrings', 'lats', 'lower back', 'middle back', 'neck', 'quadriceps', 'shoulders', 'traps', 'triceps']
+_INSTRUCTIONS = [
+    'Stand with your feet shoulder width apart.',
+    'Keep your back straight and your core engaged throughout the movement.',
+    'Slowly lower back to the starting position.',
+    'Hold the stretch for thirty seconds, breathing steadily.',
+    'Exhale as you push up and inhale on the way down.',
+    'Repeat for the recommended amount of repetitions.',
+    'Bend your knees slightly and hinge at the hips.',
+    'Lie on your back with your knees bent and feet flat on the floor.',
+    'Rotate your torso gently to one side, then return to center.'
+]
+
+
+def build_fixture_catalog(size: int = DEFAULT_CATALOG_SIZE, seed: int = FIXTURE_SEED) -> List[Dict[str, Any]]:
+    """Deterministic catalog in the free-exercise-db format, shaped like the real feed"""
+    rng = random.Random(seed)
+    exercises = []
+    for i in range(size):
+        name = f"{' '.join(rng.sample(_NAME_WORDS, rng.randint(1, 3)))} {i}"
+        exercise_id = name.replace(' ', '_')
+        exercises.append({
+            'id': exercise_id,
+            'name': name,
+            'force': rng.choice(_FORCES),
+            'level': rng.choice(_LEVELS),
+            'mechanic': rng.choice(_MECHANICS),
+            'equipment': rng.choice(_EQUIPMENT),
+            'primaryMuscles': rng.sample(_MUSCLES, rng.randint(1, 2)),
+            'secondaryMuscles': rng.sample(_MUSCLES, rng.randint(0, 3)),
+            'instructions': rng.sample(_INSTRUCTIONS, rng.randint(1, 5)),
+            'category': rng.choice(_CATEGORIES),
+            'images': [f'{exercise_id}/0.jpg', f'{exercise_id}/1.jpg']
+        })
+    return exercises
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+
+def measure(fn: Callable[[], Any], iterations: int, warmup: int = 3, ops_per_call: int = 1) -> Dict[str, Any]:
+    """Latency percentiles (ms per call), throughput (ops/s) and allocations (bytes per call) for fn"""
+    for _ in range(warmup):
+        fn()
+
+    timings = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - started
+    timings.sort()
+
+    # Allocation pass, kept separate because tracing slows everything down
+    alloc_calls = max(1, min(iterations, 20))
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        peak_total = 0
+        for _ in range(alloc_calls):
+            tracemalloc.reset_peak()
+            start_current, _ = tracemalloc.get_traced_memory()
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+            peak_total += peak - start_current
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'ops_per_call': ops_per_call,
+        'mean_ms': round(sum(timings) / len(timings), 6),
+        'p50_ms': round(_percentile(timings, 50), 6),
+        'p90_ms': round(_percentile(timings, 90), 6),
+        'p99_ms': round(_percentile(timings, 99), 6),
+        'max_ms': round(timings[-1], 6),
+        'throughput_ops_s': round(iterations * ops_per_call / elapsed, 1) if elapsed else 0.0,
+        'peak_alloc_bytes': int(peak_total / alloc_calls),
+        'retained_bytes': int(max(0, after - before) / alloc_calls)
+    }
+
+
+def run_benchmarks(catalog_size: int = DEFAULT_CATALOG_SIZE, scale: float = 1.0) -> Dict[str, Any]:
+    """Run every benchmark against a fresh fixture catalog and return the results document"""
+    def n(iterations: int) -> int:
+        return max(3, int(iterations * scale))
+
+    workdir = tempfile.mkdtemp(prefix='pt-bench-')
+    snapshot_path = os.path.join(workdir, 'exercises_snapshot.json')
+
+    # The app builds its engine at import time, so point it at the fixture first
+    os.environ['EXERCISE_CATALOG_PATH'] = snapshot_path
+    os.environ.pop('EXERCISE_CATALOG_REFRESH', None)
+    os.environ.pop('SHARED_CATALOG_DIR', None)
+    os.environ.pop('RECOMMENDATION_CACHE_WARM_CONDITIONS', None)
+    os.environ['PROGRESS_DB_PATH'] = os.path.join(workdir, 'progress.db')
+    os.environ['PROGRESS_STORE_ENABLED'] = '1'
+    # The /patients endpoints require the admin token
+    admin_token = os.environ.setdefault('ADMIN_TOKEN', 'benchmark')
+
+    from catalog import save_snapshot
+    save_snapshot(build_fixture_catalog(catalog_size), snapshot_path, source='benchmark-fixture')
+
+    import app as backend
+    from search import SearchIndex
+    from serialization import JSON_BACKEND
+
+    engine = backend.ExerciseRecommendationEngine(snapshot_path=snapshot_path)
+    grid = [
+        backend.UserProfile(pain_level=p, mobility_level=m, condition=c, goals=[])
+        for c in GRID_CONDITIONS for p in range(1, 11) for m in range(1, 11)
+    ]
+    grid_payloads = [
+        {'pain_level': u.pain_level, 'mobility_level': u.mobility_level, 'condition': u.condition}
+        for u in grid
+    ]
+    client = backend.app.test_client()
+    search_queries = itertools.cycle(SEARCH_QUERIES)
+    results: Dict[str, Dict[str, Any]] = {}
+
+    def bench(name: str, fn: Callable[[], Any], iterations: int, ops_per_call: int = 1):
+        logger.info(f"Running {name}...")
+        results[name] = measure(fn, n(iterations), ops_per_call=ops_per_call)
+
+    # Engine stages
+    bench('engine.load_exercises', lambda: backend.ExerciseRecommendationEngine(snapshot_path=snapshot_path), 10)
+    bench('engine._prepare_vectors', engine._prepare_vectors, 10)
+    bench('engine._build_views', engine._build_views, 50)
+    bench('engine.filter_pt_relevant', engine.filter_pt_relevant, 1000)
+    bench('engine.search_index.build', lambda: SearchIndex.from_store(engine.exercises, engine.views.pt_positions), 10)
+    bench('engine.search_index.search', lambda: engine.search_index.search(next(search_queries)), 2000)
+
+    profiles = itertools.cycle(grid)
+    payloads = itertools.cycle(grid_payloads)
+
+    bench('engine.get_recommendations', lambda: engine.get_recommendations(next(profiles), 10), len(grid) * 2)
+    bench('engine.get_stretching_recommendations', lambda: engine.get_stretching_recommendations(next(profiles), 8), len(grid))
+    bench('engine.build_program', lambda: engine.build_program(next(profiles), 7, 5, 2), len(grid) // 2)
+    bench('engine.get_recommendations.full_grid',
+          lambda: [engine.get_recommendations(u, 10) for u in grid], 5, ops_per_call=len(grid))
+    bench('engine.get_batch_recommendations.full_grid',
+          lambda: engine.get_batch_recommendations(grid, 10), 5, ops_per_call=len(grid))
+
+    # HTTP endpoints through the Flask test client
+    def uncached(path: str):
+        def call():
+            backend.response_cache.clear()
+            return client.post(path, json=next(payloads))
+        return call
+
+    bench('http.GET /health', lambda: client.get('/health'), 500)
+    bench('http.POST /recommendations (uncached)', uncached('/recommendations'), len(grid))
+    bench('http.POST /recommendations (cached)', lambda: client.post('/recommendations', json=grid_payloads[0]), 500)
+    bench('http.POST /stretching (uncached)', uncached('/stretching'), len(grid))
+    bench('http.POST /program (uncached)', uncached('/program'), len(grid) // 2)
+    bench('http.GET /exercises', lambda: client.get('/exercises'), 100)
+    bench('http.GET /exercises (page of 20)', lambda: client.get('/exercises?limit=20&offset=40&category=strength'), 500)
+    bench('http.GET /search', lambda: client.get('/search', query_string={'q': next(search_queries)}), 500)
+    session_payloads = itertools.cycle(
+        (f'bench-{i % 50}', {'exercise_id': f'Exercise_{i}', 'pain_level': 1 + i % 10, 'difficulty_rating': 3})
+        for i in range(1000)
+    )
+
+    def record_session():
+        patient_id, payload = next(session_payloads)
+        return client.post(f'/patients/{patient_id}/sessions', json=payload, headers={'X-Admin-Token': admin_token})
+
+    bench('http.POST /patients/<id>/sessions', record_session, 500)
+    store = backend.get_store()
+    store.flush()
+    bench('progress.history (20 newest)', lambda: store.history('sessions', f'bench-{random.randrange(50)}', limit=20), 1000)
+    bench('progress.recent_levels', lambda: store.recent_levels(f'bench-{random.randrange(50)}'), 1000)
+    bench('http.POST /recommendations/batch (500 profiles)',
+          lambda: client.post('/recommendations/batch', json={'profiles': grid_payloads}), 5,
+          ops_per_call=len(grid_payloads))
+
+    return {
+        'schema_version': BENCHMARK_SCHEMA_VERSION,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'environment': {
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'json_backend': JSON_BACKEND,
+            'catalog_size': catalog_size,
+            'catalog_version': engine.catalog_version,
+            'scale': scale
+        },
+        'results': results
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float,
+            metric: str = 'p50_ms') -> List[Dict[str, Any]]:
+    """Rows comparing metric per benchmark; a row regresses when current exceeds baseline by more than threshold"""
+    rows = []
+    for name, result in current['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is None or not previous.get(metric):
+            continue
+        ratio = result[metric] / previous[metric]
+        rows.append({
+            'name': name,
+            'baseline': previous[metric],
+            'current': result[metric],
+            'ratio': round(ratio, 3),
+            'regressed': ratio > 1 + threshold and result[metric] >= NOISE_FLOOR_MS
+        })
+    return rows
+
+
+def print_report(document: Dict[str, Any]):
+    print(f"{'benchmark':<52} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'ops/s':>12} {'peak KB':>10}")
+    for name, r in document['results'].items():
+        print(f"{name:<52} {r['p50_ms']:>10.3f} {r['p90_ms']:>10.3f} {r['p99_ms']:>10.3f} "
+              f"{r['throughput_ops_s']:>12.1f} {r['peak_alloc_bytes'] / 1024:>10.1f}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the recommendation engine and HTTP endpoints')
+    parser.add_argument('--size', type=int, default=DEFAULT_CATALOG_SIZE, help='Number of exercises in the fixture catalog')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiply iteration counts (e.g. 0.1 for a smoke run)')
+    parser.add_argument('--output', help='Write the results document to this JSON file')
+    parser.add_argument('--compare', help='Baseline JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed p50 slowdown before failing, as a fraction')
+    args = parser.parse_args(argv)
+
+    document = run_benchmarks(catalog_size=args.size, scale=args.scale)
+    print_report(document)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2)
+        print(f"\nWrote results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows = compare(baseline, document, args.threshold)
+        print(f"\n{'benchmark':<52} {'baseline':>10} {'current':>10} {'ratio':>8}")
+        for row in rows:
+            flag = '  REGRESSION' if row['regressed'] else ''
+            print(f"{row['name']:<52} {row['baseline']:>10.3f} {row['current']:>10.3f} {row['ratio']:>8.3f}{flag}")
+        if any(row['regressed'] for row in rows):
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(main())
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Exercise Catalog Store
+Keeps a versioned local snapshot of the free-exercise-db catalog so the backend can boot without network access
+"""
+
+import os
+import sys
+import json
+import hashlib
+import logging
+import tempfile
+import argparse
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Sequence
+from dataclasses import dataclass, field
+
+from catalog_sources import CatalogSource, RemoteJSONSource, SourceError, load_sources, load_sources_config
+
+logger = logging.getLogger(__name__)
+
+CATALOG_URL = 'https://raw.githubusercontent.com/yuhonas/free-exercise-db/main/dist/exercises.json'
+CATALOG_SCHEMA_VERSION = 1
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'exercises_snapshot.json')
+
+
+class CatalogError(Exception):
+    """Raised when a catalog snapshot is missing, unreadable or inconsistent"""
+
+
+@dataclass
+class CatalogSnapshot:
+    schema_version: int
+    content_hash: str
+    source: str
+    fetched_at: str
+    exercises: List[Dict[str, Any]]
+    sources: List[Dict[str, Any]] = field(default_factory=list)  # per-source load reports
+
+    @property
+    def version(self) -> str:
+        """Short catalog version used in logs, cache keys and ETags"""
+        return self.content_hash[:12]
+
+
+def get_snapshot_path() -> str:
+    """Snapshot location, overridable with EXERCISE_CATALOG_PATH"""
+    return os.environ.get('EXERCISE_CATALOG_PATH', DEFAULT_SNAPSHOT_PATH)
+
+
+def get_catalog_sources(url: str = CATALOG_URL) -> List[CatalogSource]:
+    """Sources listed in the CATALOG_SOURCES config file, or just the remote catalog at url"""
+    config_path = os.environ.get('CATALOG_SOURCES')
+    if config_path:
+        return load_sources_config(config_path)
+    return [RemoteJSONSource('free-exercise-db', url)]
+
+
+def compute_content_hash(raw_exercises: List[Dict[str, Any]]) -> str:
+    """SHA-256 over a canonical JSON encoding of the raw exercise list"""
+    canonical = json.dumps(raw_exercises, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def compute_exercise_hash(fields: Sequence[Any]) -> bytes:
+    """Digest of one normalized exercise record (its field values in order), used to spot changed rows"""
+    return hashlib.blake2b(repr(tuple(fields)).encode('utf-8'), digest_size=16).digest()
+
+
+@dataclass
+class CatalogDelta:
+    """Row-level difference between two catalogs, in positions of the new catalog"""
+    added: List[int]
+    changed: List[int]
+    unchanged: Dict[int, int]  # new position -> previous position
+    removed: int
+
+    @property
+    def fresh(self) -> List[int]:
+        """New positions whose derived data has to be recomputed"""
+        return sorted(self.added + self.changed)
+
+
+def diff_catalogs(previous_ids: Sequence[str], previous_hashes: Sequence[bytes],
+                  ids: Sequence[str], hashes: Sequence[bytes]) -> CatalogDelta:
+    """Match rows by id and compare content hashes"""
+    previous_position = {exercise_id: i for i, exercise_id in enumerate(previous_ids)}
+    added, changed, unchanged = [], [], {}
+    for position, (exercise_id, content_hash) in enumerate(zip(ids, hashes)):
+        old = previous_position.get(exercise_id)
+        if old is None:
+            added.append(position)
+        elif previous_hashes[old] == content_hash:
+            unchanged[position] = old
+        else:
+            changed.append(position)
+    removed = len(set(previous_position) - set(ids))
+    return CatalogDelta(added=added, changed=changed, unchanged=unchanged, removed=removed)
+
+
+def load_snapshot(path: str) -> CatalogSnapshot:
+    """Load and verify a catalog snapshot from disk"""
+    if not os.path.exists(path):
+        raise CatalogError(
+            f"No exercise catalog snapshot at {path}. "
+            f"Run 'python catalog.py refresh' to create one."
+        )
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+    except (OSError, ValueError) as e:
+        raise CatalogError(f"Failed to read catalog snapshot {path}: {e}")
+
+    schema_version = payload.get('schema_version')
+    if schema_version != CATALOG_SCHEMA_VERSION:
+        raise CatalogError(
+            f"Catalog snapshot {path} has schema version {schema_version}, "
+            f"expected {CATALOG_SCHEMA_VERSION}. Run 'python catalog.py refresh' to regenerate it."
+        )
+
+    exercises = payload.get('exercises', [])
+    content_hash = compute_content_hash(exercises)
+    if content_hash != payload.get('content_hash'):
+        raise CatalogError(f"Catalog snapshot {path} failed its content hash check")
+
+    return CatalogSnapshot(
+        schema_version=schema_version,
+        content_hash=content_hash,
+        source=payload.get('source', ''),
+        fetched_at=payload.get('fetched_at', ''),
+        exercises=exercises,
+        sources=payload.get('sources', [])
+    )
+
+
+def save_snapshot(raw_exercises: List[Dict[str, Any]], path: str, source: str = CATALOG_URL,
+                  sources: Optional[List[Dict[str, Any]]] = None) -> CatalogSnapshot:
+    """Write a catalog snapshot atomically so readers never see a partial file"""
+    snapshot = CatalogSnapshot(
+        schema_version=CATALOG_SCHEMA_VERSION,
+        content_hash=compute_content_hash(raw_exercises),
+        source=source,
+        fetched_at=datetime.now(timezone.utc).isoformat(),
+        exercises=raw_exercises,
+        sources=sources or []
+    )
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.exercises_snapshot.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({
+                'schema_version': snapshot.schema_version,
+                'content_hash': snapshot.content_hash,
+                'source': snapshot.source,
+                'fetched_at': snapshot.fetched_at,
+                'sources': snapshot.sources,
+                'exercises': snapshot.exercises
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    logger.info(f"Saved catalog snapshot {snapshot.version} ({len(raw_exercises)} exercises) to {path}")
+    return snapshot
+
+
+def refresh_snapshot(path: str, url: str = CATALOG_URL,
+                     sources: Optional[Sequence[CatalogSource]] = None) -> CatalogSnapshot:
+    """Load every catalog source concurrently, merge them and replace the local snapshot with the result.
+
+    Without explicit sources, uses get_catalog_sources(url). The snapshot is left untouched
+    if a required source fails.
+    """
+    try:
+        sources = list(sources) if sources is not None else get_catalog_sources(url)
+        merged = load_sources(sources)
+    except (SourceError, OSError, ValueError) as e:
+        raise CatalogError(f"Catalog refresh failed: {e}")
+
+    logger.info(f"Merged {len(merged.exercises)} exercises from {len(sources)} sources in {merged.elapsed_ms}ms")
+    return save_snapshot(
+        merged.exercises,
+        path,
+        source=', '.join(s.describe() for s in sources),
+        sources=[report.to_dict() for report in merged.reports]
+    )
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Manage the local exercise catalog snapshot')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    refresh_parser = subparsers.add_parser('refresh', help='Load and merge the catalog sources into the snapshot file')
+    refresh_parser.add_argument('--url', default=CATALOG_URL, help='Catalog URL to fetch when no sources config is given')
+    refresh_parser.add_argument('--sources', help='JSON file listing catalog sources (defaults to $CATALOG_SOURCES)')
+    refresh_parser.add_argument('--output', default=get_snapshot_path(), help='Snapshot file to write')
+
+    info_parser = subparsers.add_parser('info', help='Show the version of the local snapshot')
+    info_parser.add_argument('--path', default=get_snapshot_path(), help='Snapshot file to read')
+
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'refresh':
+            sources = load_sources_config(args.sources) if args.sources else None
+            snapshot = refresh_snapshot(args.output, args.url, sources)
+        else:
+            snapshot = load_snapshot(args.path)
+    except Exception as e:
+        logger.error(f"Catalog {args.command} failed: {e}")
+        return 1
+
+    print(json.dumps({
+        'version': snapshot.version,
+        'schema_version': snapshot.schema_version,
+        'content_hash': snapshot.content_hash,
+        'source': snapshot.source,
+        'fetched_at': snapshot.fetched_at,
+        'exercises': len(snapshot.exercises),
+        'sources': snapshot.sources
+    }, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Catalog Sources
+Pluggable exercise providers (remote JSON, local JSON and CSV) loaded concurrently, normalized and merged into one catalog
+"""
+
+import os
+import csv
+import json
+import abc
+import time
+import logging
+from dataclasses import dataclass, field, asdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on sources fetched at the same time
+MAX_SOURCE_WORKERS = int(os.environ.get('CATALOG_SOURCE_WORKERS', 8))
+
+# Rejected records listed per source in the load report
+MAX_REPORTED_ERRORS = 10
+
+LIST_FIELDS = ('primaryMuscles', 'secondaryMuscles', 'instructions', 'images')
+OPTIONAL_FIELDS = ('force', 'mechanic', 'equipment')
+
+# Fields whose values are compared case-insensitively, so they are stored lowercase
+LOWERCASE_FIELDS = ('force', 'level', 'mechanic', 'equipment', 'category', 'primaryMuscles', 'secondaryMuscles')
+
+
+class SourceError(Exception):
+    """Raised when a source cannot be read, or when a required source fails during a merge"""
+
+
+class CatalogSource(abc.ABC):
+    """A provider of raw exercise records in the free-exercise-db shape.
+
+    Sources are merged in the order they are configured: when two sources provide the same
+    id or name, the record from the earlier source wins. A failing required source fails the
+    whole load; optional sources are reported and skipped.
+    """
+
+    kind = 'base'
+
+    def __init__(self, name: str, required: bool = True):
+        self.name = name
+        self.required = required
+
+    @abc.abstractmethod
+    def fetch(self) -> List[Dict[str, Any]]:
+        """The source's raw exercise records; raises SourceError (or any I/O error) when it cannot be read"""
+
+    def describe(self) -> str:
+        return self.name
+
+
+class RemoteJSONSource(CatalogSource):
+    """A JSON array of exercises served over HTTP"""
+
+    kind = 'remote'
+
+    def __init__(self, name: str, url: str, timeout: float = 30.0, required: bool = True):
+        super().__init__(name, required)
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self) -> List[Dict[str, Any]]:
+        logger.info(f"Fetching exercise catalog from {self.url}...")
+        response = requests.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+
+        raw_exercises = response.json()
+        if not isinstance(raw_exercises, list):
+            raise SourceError(f"Unexpected catalog payload from {self.url}: expected a list of exercises")
+        return raw_exercises
+
+    def describe(self) -> str:
+        return self.url
+
+
+class LocalJSONSource(CatalogSource):
+    """A JSON file holding a list of exercises, or an object with an "exercises" list"""
+
+    kind = 'json'
+
+    def __init__(self, name: str, path: str, required: bool = True):
+        super().__init__(name, required)
+        self.path = path
+
+    def fetch(self) -> List[Dict[str, Any]]:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+        if isinstance(payload, dict):
+            payload = payload.get('exercises')
+        if not isinstance(payload, list):
+            raise SourceError(f"{self.path} does not contain a list of exercises")
+        return payload
+
+    def describe(self) -> str:
+        return self.path
+
+
+class LocalCSVSource(CatalogSource):
+    """A CSV file with one exercise per row; list columns hold values joined by `list_separator`"""
+
+    kind = 'csv'
+
+    def __init__(self, name: str, path: str, list_separator: str = ';', required: bool = True):
+        super().__init__(name, required)
+        self.path = path
+        self.list_separator = list_separator
+
+    def fetch(self) -> List[Dict[str, Any]]:
+        with open(self.path, 'r', encoding='utf-8-sig', newline='') as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            for list_field in LIST_FIELDS:
+                value = row.get(list_field)
+                if isinstance(value, str):
+                    row[list_field] = value.split(self.list_separator) if value else []
+        return rows
+
+    def describe(self) -> str:
+        return self.path
+
+
+SOURCE_TYPES = {
+    RemoteJSONSource.kind: RemoteJSONSource,
+    LocalJSONSource.kind: LocalJSONSource,
+    LocalCSVSource.kind: LocalCSVSource
+}
+
+
+def source_from_config(config: Dict[str, Any], base_dir: str = '.') -> CatalogSource:
+    """Build a source from a config entry such as {"type": "csv", "name": "clinic", "path": "clinic.csv"}"""
+    options = dict(config)
+    kind = options.pop('type', None)
+    source_class = SOURCE_TYPES.get(kind)
+    if source_class is None:
+        raise SourceError(f"Unknown catalog source type {kind!r}; expected one of {sorted(SOURCE_TYPES)}")
+
+    if 'path' in options:
+        options['path'] = os.path.join(base_dir, os.path.expanduser(options['path']))
+    options.setdefault('name', options.get('url') or options.get('path'))
+    try:
+        return source_class(**options)
+    except TypeError as e:
+        raise SourceError(f"Invalid options for {kind} catalog source: {e}")
+
+
+def load_sources_config(path: str) -> List[CatalogSource]:
+    """Read a JSON list of source entries; relative file paths are resolved against the config's directory"""
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    if not isinstance(entries, list) or not entries:
+        raise SourceError(f"{path} must contain a non-empty list of catalog sources")
+    base_dir = os.path.dirname(os.path.abspath(path))
+    return [source_from_config(entry, base_dir) for entry in entries]
+
+
+def _clean_text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+
+def normalize_exercise(raw: Any) -> Dict[str, Any]:
+    """Validate a raw record and coerce it into the Exercise schema, raising ValueError if it is unusable"""
+    if not isinstance(raw, dict):
+        raise ValueError('record is not an object')
+
+    name = _clean_text(raw.get('name'))
+    if name is None:
+        raise ValueError('missing name')
+    exercise_id = _clean_text(raw.get('id')) or name.replace(' ', '_')
+
+    exercise: Dict[str, Any] = {'id': exercise_id, 'name': name}
+    for optional_field in OPTIONAL_FIELDS:
+        exercise[optional_field] = _clean_text(raw.get(optional_field))
+    exercise['level'] = _clean_text(raw.get('level')) or 'beginner'
+    exercise['category'] = _clean_text(raw.get('category')) or 'general'
+
+    for list_field in LIST_FIELDS:
+        value = raw.get(list_field)
+        if value is None:
+            value = []
+        elif isinstance(value, str):
+            value = [value]
+        elif not isinstance(value, (list, tuple)):
+            raise ValueError(f'{list_field} must be a list')
+        exercise[list_field] = [text for text in (_clean_text(item) for item in value) if text is not None]
+
+    for lowercase_field in LOWERCASE_FIELDS:
+        value = exercise[lowercase_field]
+        if isinstance(value, list):
+            exercise[lowercase_field] = [item.lower() for item in value]
+        elif value is not None:
+            exercise[lowercase_field] = value.lower()
+
+    # Same key order as the upstream feed
+    return {key: exercise[key] for key in (
+        'id', 'name', 'force', 'level', 'mechanic', 'equipment',
+        'primaryMuscles', 'secondaryMuscles', 'instructions', 'category', 'images'
+    )}
+
+
+def _name_key(name: str) -> str:
+    return ' '.join(name.casefold().split())
+
+
+@dataclass
+class SourceReport:
+    name: str
+    kind: str
+    location: str
+    required: bool
+    fetched: int = 0
+    accepted: int = 0
+    rejected: int = 0
+    duplicates: int = 0
+    elapsed_ms: float = 0.0
+    error: Optional[str] = None
+    rejected_samples: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class MergedCatalog:
+    exercises: List[Dict[str, Any]]
+    reports: List[SourceReport]
+    elapsed_ms: float
+
+
+def _load_one(source: CatalogSource) -> Tuple[SourceReport, List[Dict[str, Any]]]:
+    """Fetch and normalize one source, capturing its timing and any error instead of raising"""
+    report = SourceReport(name=source.name, kind=source.kind, location=source.describe(), required=source.required)
+    started = time.perf_counter()
+    normalized: List[Dict[str, Any]] = []
+    try:
+        raw_exercises = source.fetch()
+        report.fetched = len(raw_exercises)
+        for index, raw in enumerate(raw_exercises):
+            try:
+                normalized.append(normalize_exercise(raw))
+            except ValueError as e:
+                report.rejected += 1
+                if len(report.rejected_samples) < MAX_REPORTED_ERRORS:
+                    report.rejected_samples.append(f"record {index}: {e}")
+    except Exception as e:
+        report.error = f"{type(e).__name__}: {e}"
+        normalized = []
+    report.elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+    return report, normalized
+
+
+def load_sources(sources: Sequence[CatalogSource], max_workers: Optional[int] = None) -> MergedCatalog:
+    """Fetch every source concurrently, then merge them in priority order.
+
+    Exercises are deduplicated by id and by case- and whitespace-insensitive name; the first
+    source to provide either wins. Raises SourceError if a required source failed.
+    """
+    started = time.perf_counter()
+    workers = max(1, min(len(sources), max_workers or MAX_SOURCE_WORKERS))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='catalog-source') as pool:
+        results = list(pool.map(_load_one, sources))
+
+    failed = [report for report, _ in results if report.error and report.required]
+    for report, _ in results:
+        if report.error:
+            logger.warning(f"Catalog source {report.name} failed after {report.elapsed_ms}ms: {report.error}")
+    if failed:
+        raise SourceError('; '.join(f"required source {r.name} failed: {r.error}" for r in failed))
+
+    merged: List[Dict[str, Any]] = []
+    seen_ids = set()
+    seen_names = set()
+    for report, exercises in results:
+        for exercise in exercises:
+            name_key = _name_key(exercise['name'])
+            if exercise['id'] in seen_ids or name_key in seen_names:
+                report.duplicates += 1
+                continue
+            seen_ids.add(exercise['id'])
+            seen_names.add(name_key)
+            merged.append(exercise)
+            report.accepted += 1
+        logger.info(
+            f"Catalog source {report.name}: {report.accepted} accepted, {report.rejected} rejected, "
+            f"{report.duplicates} duplicates in {report.elapsed_ms}ms"
+        )
+
+    return MergedCatalog(
+        exercises=merged,
+        reports=[report for report, _ in results],
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 1)
+    )
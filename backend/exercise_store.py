@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Columnar Exercise Store
+Compact, array-backed storage for the exercise catalog with lightweight per-row views
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+# Categorical columns stored as small integer codes into a per-column vocabulary
+CATEGORICAL_FIELDS = ('force', 'level', 'mechanic', 'equipment', 'category')
+
+# Field order of the JSON representation, matching the Exercise dataclass
+EXERCISE_FIELDS = (
+    'id', 'name', 'force', 'level', 'mechanic', 'equipment',
+    'primaryMuscles', 'secondaryMuscles', 'instructions', 'category', 'images'
+)
+
+
+class ExerciseView:
+    """Read-only view of one store row exposing the same attributes as the Exercise dataclass"""
+
+    __slots__ = ('_store', 'position')
+
+    def __init__(self, store: 'ExerciseStore', position: int):
+        self._store = store
+        self.position = position
+
+    @property
+    def store(self) -> 'ExerciseStore':
+        return self._store
+
+    @property
+    def id(self) -> str:
+        return self._store.ids[self.position]
+
+    @property
+    def name(self) -> str:
+        return self._store.names[self.position]
+
+    @property
+    def force(self) -> Optional[str]:
+        return self._store.categorical('force', self.position)
+
+    @property
+    def level(self) -> str:
+        return self._store.categorical('level', self.position)
+
+    @property
+    def mechanic(self) -> Optional[str]:
+        return self._store.categorical('mechanic', self.position)
+
+    @property
+    def equipment(self) -> Optional[str]:
+        return self._store.categorical('equipment', self.position)
+
+    @property
+    def category(self) -> str:
+        return self._store.categorical('category', self.position)
+
+    @property
+    def primaryMuscles(self) -> List[str]:
+        return self._store.muscle_run(self.position, 0)
+
+    @property
+    def secondaryMuscles(self) -> List[str]:
+        return self._store.muscle_run(self.position, 1)
+
+    @property
+    def instructions(self) -> List[str]:
+        return self._store.text_run(self.position, 0)
+
+    @property
+    def images(self) -> List[str]:
+        return self._store.text_run(self.position, 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Same shape as dataclasses.asdict() on the equivalent Exercise"""
+        return {field: getattr(self, field) for field in EXERCISE_FIELDS}
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, ExerciseView):
+            return self._store is other._store and self.position == other.position
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((id(self._store), self.position))
+
+    def __repr__(self) -> str:
+        return f"ExerciseView(id={self.id!r}, name={self.name!r})"
+
+
+class ExerciseStore(Sequence):
+    """Catalog stored column by column.
+
+    Categorical fields are integer codes into interned vocabularies (code 0 is None), muscle lists
+    are ordered code runs plus per-row bitmasks for filtering, and instructions and image paths
+    are offsets into one shared text buffer. Each row's runs are described by a split array
+    [start, end of first run, end of second run]. Indexing returns an ExerciseView.
+    """
+
+    def __init__(self, exercises: Iterable[Any] = ()):
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.vocabularies: Dict[str, List[Any]] = {field: [None] for field in CATEGORICAL_FIELDS}
+        self.muscle_vocab: List[str] = []
+
+        vocab_codes: Dict[str, Dict[Any, int]] = {field: {None: 0} for field in CATEGORICAL_FIELDS}
+        muscle_codes: Dict[str, int] = {}
+        codes: Dict[str, List[int]] = {field: [] for field in CATEGORICAL_FIELDS}
+        muscle_items: List[int] = []
+        muscle_splits: List[tuple] = []
+        text_items: List[str] = []
+        text_splits: List[tuple] = []
+
+        for ex in exercises:
+            self.ids.append(ex.id)
+            self.names.append(ex.name)
+
+            for field in CATEGORICAL_FIELDS:
+                value = getattr(ex, field)
+                field_codes = vocab_codes[field]
+                if value not in field_codes:
+                    field_codes[value] = len(self.vocabularies[field])
+                    self.vocabularies[field].append(value)
+                codes[field].append(field_codes[value])
+
+            primary = []
+            for muscle in ex.primaryMuscles:
+                primary.append(muscle_codes.setdefault(muscle, len(muscle_codes)))
+            secondary = []
+            for muscle in ex.secondaryMuscles:
+                secondary.append(muscle_codes.setdefault(muscle, len(muscle_codes)))
+            start = len(muscle_items)
+            muscle_items.extend(primary)
+            muscle_items.extend(secondary)
+            muscle_splits.append((start, start + len(primary), len(muscle_items)))
+
+            start = len(text_items)
+            text_items.extend(ex.instructions)
+            text_items.extend(ex.images)
+            text_splits.append((start, start + len(ex.instructions), len(text_items)))
+
+        self.muscle_vocab = [None] * len(muscle_codes)
+        for muscle, code in muscle_codes.items():
+            self.muscle_vocab[code] = muscle
+
+        self.codes: Dict[str, np.ndarray] = {
+            field: np.asarray(values, dtype=_code_dtype(len(self.vocabularies[field])))
+            for field, values in codes.items()
+        }
+
+        self.muscle_items = np.asarray(muscle_items, dtype=_code_dtype(len(self.muscle_vocab)))
+        self.muscle_splits = np.asarray(muscle_splits, dtype=np.int64).reshape(-1, 3)
+
+        # One 64-bit word per 64 distinct muscles; bit k of word k // 64 marks muscle code k
+        words = max(1, (len(self.muscle_vocab) + 63) // 64)
+        self.primary_mask = np.zeros((len(self.ids), words), dtype=np.uint64)
+        self.secondary_mask = np.zeros((len(self.ids), words), dtype=np.uint64)
+        owner = np.repeat(np.arange(len(self.ids)), self.muscle_splits[:, 2] - self.muscle_splits[:, 0])
+        is_primary = np.arange(len(self.muscle_items)) < self.muscle_splits[owner, 1]
+        item_codes = self.muscle_items.astype(np.int64)
+        bits = np.left_shift(np.uint64(1), (item_codes % 64).astype(np.uint64))
+        for mask, selected in ((self.primary_mask, is_primary), (self.secondary_mask, ~is_primary)):
+            np.bitwise_or.at(mask, (owner[selected], item_codes[selected] // 64), bits[selected])
+
+        self.text = ''.join(text_items)
+        text_offsets = np.zeros(len(text_items) + 1, dtype=np.int64)
+        np.cumsum([len(t) for t in text_items], out=text_offsets[1:])
+        self.text_offsets = text_offsets
+        self.text_splits = np.asarray(text_splits, dtype=np.int64).reshape(-1, 3)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, position: int) -> ExerciseView:
+        if position < 0:
+            position += len(self.ids)
+        if not 0 <= position < len(self.ids):
+            raise IndexError('exercise index out of range')
+        return ExerciseView(self, position)
+
+    def __iter__(self) -> Iterator[ExerciseView]:
+        for position in range(len(self.ids)):
+            yield ExerciseView(self, position)
+
+    def categorical(self, field: str, position: int) -> Any:
+        return self.vocabularies[field][self.codes[field][position]]
+
+    def muscle_run(self, position: int, run: int) -> List[str]:
+        """Primary (run 0) or secondary (run 1) muscles of a row, in their original order"""
+        start, end = self.muscle_splits[position, run], self.muscle_splits[position, run + 1]
+        return [self.muscle_vocab[code] for code in self.muscle_items[start:end]]
+
+    def text_run(self, position: int, run: int) -> List[str]:
+        """Instructions (run 0) or image paths (run 1) of a row"""
+        start, end = self.text_splits[position, run], self.text_splits[position, run + 1]
+        offsets = self.text_offsets
+        return [self.text[offsets[k]:offsets[k + 1]] for k in range(start, end)]
+
+    def codes_for(self, field: str, values: Iterable[str]) -> List[int]:
+        """Codes of a categorical column whose value matches any of the given values case-insensitively"""
+        wanted = {v.lower() for v in values}
+        return [
+            code for code, value in enumerate(self.vocabularies[field])
+            if (value.lower() if isinstance(value, str) else '' if not value else None) in wanted
+        ]
+
+    def muscle_mask(self, muscles: Iterable[str]) -> np.ndarray:
+        """Bitmask words selecting the given muscles, matched case-insensitively"""
+        wanted = {m.lower() for m in muscles}
+        mask = np.zeros(self.primary_mask.shape[1], dtype=np.uint64)
+        for code, muscle in enumerate(self.muscle_vocab):
+            if muscle.lower() in wanted:
+                mask[code // 64] |= np.uint64(1 << (code % 64))
+        return mask
+
+
+def _code_dtype(vocab_size: int) -> type:
+    if vocab_size <= np.iinfo(np.uint8).max:
+        return np.uint8
+    if vocab_size <= np.iinfo(np.uint16).max:
+        return np.uint16
+    return np.uint32
@@ -0,0 +1,53 @@
+"""
+Gunicorn configuration for the Physical Therapy Exercise Recommendation Backend
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is preloaded in the master so the catalog is parsed, vectorized and exported to
+SHARED_CATALOG_DIR once before forking; workers then read the memory-mapped artifacts
+instead of building private copies.
+
+A reload via /admin/reload or SIGHUP to a worker runs in that worker and publishes the new
+catalog version in SHARED_CATALOG_DIR; the other workers notice it within CATALOG_SYNC_INTERVAL
+and reload too. Workers forked later (max_requests, crashes) start from the master's older
+catalog, so post_fork brings them up to the published version before they serve.
+
+SIGHUP to the master reloads the catalog in the master (on_reload) before gunicorn replaces
+the workers, so the new workers are forked with it.
+"""
+
+import gc
+import os
+import multiprocessing
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5001')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+preload_app = True
+
+# Share the memory-mapped catalog artifacts between the master and every worker
+os.environ.setdefault('SHARED_CATALOG_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'shared'))
+
+
+def pre_fork(server, worker):
+    # Move everything the master has built into the permanent generation so the
+    # collector in each worker never touches (and copies) those pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # A worker forked after another one reloaded starts with the master's older catalog;
+    # catch up with the published version before serving
+    import app
+    app.sync_published_catalog(wait=True)
+
+
+def post_worker_init(worker):
+    # Gunicorn resets every signal in a new worker, which would make SIGHUP kill it
+    import app
+    app.install_reload_signal()
+
+
+def on_reload(server):
+    # SIGHUP to the master: reload here so the replacement workers fork with the new catalog
+    import app
+    app.reload_engine(refresh=app.refresh_on_signal())
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Program Selection
+Diversity-aware top-k selection (maximal marginal relevance) with lazy greedy evaluation and an optional cost budget
+"""
+
+import heapq
+import logging
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def select_diverse(relevance: np.ndarray, similarity: np.ndarray, k: int, candidates: np.ndarray,
+                   diversity: float = 0.3, costs: Optional[np.ndarray] = None,
+                   budget: Optional[float] = None, initial: Sequence[int] = ()) -> List[int]:
+    """Pick up to k of `candidates` greedily by maximal marginal relevance.
+
+    The gain of item i given the picks S is (1 - diversity) * relevance[i] - diversity * max_j∈S similarity[i, j].
+    Gains only shrink as S grows, so a max-heap of possibly stale gains is enough: the top entry is
+    re-evaluated against the picks made since it was last scored and taken if it is still on top.
+    Each pick pops a handful of entries, so after heapify a selection costs about O(k log n).
+
+    With costs and a budget, an item is skipped when taking it would leave too little budget to
+    fill the remaining slots with the cheapest candidate. Once an item does not fit it never will,
+    so it is dropped rather than pushed back.
+
+    `initial` items count as already picked: they take up slots and budget, are penalized
+    against, and lead the returned list.
+    """
+    candidates = np.asarray(candidates, dtype=np.intp)
+    picked: List[int] = [int(i) for i in initial]
+    if k <= len(picked) or len(candidates) == 0:
+        return picked
+
+    weight = 1.0 - diversity
+    # Plain Python floats: the loop reads one element at a time
+    gains = (weight * relevance).tolist()
+    item_costs = costs.tolist() if costs is not None else None
+    max_similarity = [0.0] * len(gains)
+    # (negated gain, candidate, number of picks the gain was computed against)
+    candidate_list = candidates.tolist()
+    heap = list(zip([-gains[i] for i in candidate_list], candidate_list, [0] * len(candidate_list)))
+    heapq.heapify(heap)
+
+    min_cost = min(item_costs[i] for i in candidate_list) if item_costs is not None else 0.0
+    remaining = budget - sum(item_costs[i] for i in picked) if budget is not None else None
+    while heap and len(picked) < k:
+        negative_gain, i, seen = heapq.heappop(heap)
+        if remaining is not None and item_costs[i] + (k - len(picked) - 1) * min_cost > remaining:
+            continue
+        if seen < len(picked):
+            max_similarity[i] = max(max_similarity[i], float(similarity[i, picked[seen:]].max()))
+            heapq.heappush(heap, (diversity * max_similarity[i] - gains[i], i, len(picked)))
+            continue
+
+        if remaining is not None:
+            remaining -= item_costs[i]
+        picked.append(i)
+
+    return picked
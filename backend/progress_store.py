@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Progress Store
+Per-patient sessions and assessments in SQLite (WAL mode), written behind the request path in batches
+"""
+
+import os
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import registry, stage
+
+logger = logging.getLogger(__name__)
+
+# The store holds patient health records, so it is off unless PROGRESS_STORE_ENABLED=1 (the /patients endpoints answer 404 meanwhile)
+PROGRESS_STORE_ENABLED = os.environ.get('PROGRESS_STORE_ENABLED', '0').lower() in ('1', 'true', 'yes')
+
+PROGRESS_DB_PATH = os.environ.get(
+    'PROGRESS_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'progress.db')
+)
+
+# Rows written per transaction, and how long the writer waits to fill a batch once it has a row
+PROGRESS_BATCH_SIZE = int(os.environ.get('PROGRESS_BATCH_SIZE', 500))
+PROGRESS_FLUSH_INTERVAL = float(os.environ.get('PROGRESS_FLUSH_INTERVAL', 0.05))
+
+# Rows waiting to be written before new writes are refused
+PROGRESS_QUEUE_MAX = int(os.environ.get('PROGRESS_QUEUE_MAX', 100000))
+
+# Attempts at committing a batch before its rows are dropped, and the wait before the first retry (doubled each time)
+PROGRESS_WRITE_ATTEMPTS = int(os.environ.get('PROGRESS_WRITE_ATTEMPTS', 5))
+PROGRESS_RETRY_BACKOFF = float(os.environ.get('PROGRESS_RETRY_BACKOFF', 0.1))
+
+# Days of pain reports averaged into a patient's recent pain level
+PROGRESS_TREND_DAYS = float(os.environ.get('PROGRESS_TREND_DAYS', 7))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    patient_id TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    exercise_id TEXT NOT NULL,
+    completed INTEGER NOT NULL,
+    pain_level INTEGER,
+    difficulty_rating INTEGER,
+    notes TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_patient_time ON sessions (patient_id, recorded_at);
+CREATE TABLE IF NOT EXISTS assessments (
+    id INTEGER PRIMARY KEY,
+    patient_id TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    pain_level INTEGER NOT NULL,
+    mobility_level INTEGER NOT NULL,
+    condition TEXT,
+    goals TEXT
+);
+CREATE INDEX IF NOT EXISTS assessments_patient_time ON assessments (patient_id, recorded_at);
+"""
+
+# Columns written and read per table, in insert order
+COLUMNS = {
+    'sessions': ('patient_id', 'recorded_at', 'exercise_id', 'completed', 'pain_level', 'difficulty_rating', 'notes'),
+    'assessments': ('patient_id', 'recorded_at', 'pain_level', 'mobility_level', 'condition', 'goals')
+}
+
+rows_written = registry.counter('pt_progress_rows_written_total', 'Progress rows committed to the store', ('table',))
+rows_rejected = registry.counter('pt_progress_rows_rejected_total', 'Progress rows refused because the write queue was full')
+write_failures = registry.counter('pt_progress_write_failures_total', 'Failed attempts at committing a batch of progress rows')
+rows_dropped = registry.counter('pt_progress_rows_dropped_total', 'Progress rows dropped after every write attempt failed',
+                                ('table',))
+
+
+class StoreBusy(Exception):
+    """Raised when the write queue is full; the caller should retry later"""
+
+
+def parse_timestamp(value: Any) -> float:
+    """Epoch seconds from epoch seconds (number or string), an ISO date or an ISO datetime (naive values are UTC); now if missing"""
+    if value is None or value == '':
+        return time.time()
+    if isinstance(value, bool):
+        raise ValueError('timestamp must be a number or an ISO 8601 string')
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def format_timestamp(value: float) -> str:
+    return datetime.fromtimestamp(value, tz=timezone.utc).isoformat()
+
+
+def _level(value: Any, field: str, required: bool = True) -> Optional[int]:
+    if value is None and not required:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or not (1 <= value <= 10):
+        raise ValueError(f'{field} must be an integer between 1 and 10')
+    return value
+
+
+def session_row(patient_id: str, data: Dict[str, Any]) -> Tuple:
+    """Validate one workout log ({"exercise_id", "date", "completed", "pain_level", "difficulty_rating", "notes"})"""
+    if not isinstance(data, dict):
+        raise ValueError('session must be a JSON object')
+    exercise_id = data.get('exercise_id')
+    if not isinstance(exercise_id, str) or not exercise_id:
+        raise ValueError('exercise_id is required')
+    return (
+        patient_id,
+        parse_timestamp(data.get('recorded_at', data.get('date'))),
+        exercise_id,
+        1 if data.get('completed', True) else 0,
+        _level(data.get('pain_level'), 'pain_level', required=False),
+        _level(data.get('difficulty_rating'), 'difficulty_rating', required=False),
+        str(data['notes']) if data.get('notes') is not None else None
+    )
+
+
+def assessment_row(patient_id: str, data: Dict[str, Any]) -> Tuple:
+    """Validate one assessment ({"pain_level", "mobility_level", "condition", "goals", "recorded_at"})"""
+    if not isinstance(data, dict):
+        raise ValueError('assessment must be a JSON object')
+    goals = data.get('goals')
+    return (
+        patient_id,
+        parse_timestamp(data.get('recorded_at', data.get('date'))),
+        _level(data.get('pain_level'), 'pain_level'),
+        _level(data.get('mobility_level'), 'mobility_level'),
+        str(data['condition']) if data.get('condition') is not None else None,
+        json.dumps(goals) if goals is not None else None
+    )
+
+
+class ProgressStore:
+    """Sessions and assessments keyed by patient, with write-behind batching.
+
+    Writes are validated on the caller's thread and queued; one writer thread per process
+    commits them in batches of up to `batch_size` rows per transaction, so requests never
+    wait on the disk. Reads use one connection per thread. WAL mode lets them run alongside
+    the writer, and every history query is a range scan on a (patient_id, recorded_at) index.
+    Queued rows become visible once their batch commits, normally within `flush_interval`.
+    A batch that fails to commit is retried with exponential backoff, up to `write_attempts` times.
+
+    The writer thread is started on first use in each process, so a store created before
+    gunicorn forks its workers still gets one writer per worker.
+    """
+
+    def __init__(self, path: str = PROGRESS_DB_PATH, batch_size: int = PROGRESS_BATCH_SIZE,
+                 flush_interval: float = PROGRESS_FLUSH_INTERVAL, max_queue: int = PROGRESS_QUEUE_MAX,
+                 write_attempts: int = PROGRESS_WRITE_ATTEMPTS, retry_backoff: float = PROGRESS_RETRY_BACKOFF):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.write_attempts = max(1, write_attempts)
+        self.retry_backoff = retry_backoff
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._enqueue_lock = threading.Lock()
+        self._queue: Optional[queue.Queue] = None
+        self._writer: Optional[threading.Thread] = None
+        self._local = threading.local()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+        connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def _reader(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = self._connect()
+            connection.row_factory = sqlite3.Row
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _ensure_writer(self) -> queue.Queue:
+        if self._pid == os.getpid():
+            return self._queue
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_queue)
+                self._writer = threading.Thread(target=self._write_loop, args=(self._queue,),
+                                                name='progress-writer', daemon=True)
+                self._writer.start()
+                self._pid = os.getpid()
+        return self._queue
+
+    def record(self, table: str, rows: List[Tuple]):
+        """Queue validated rows for `table`, all or none; raises StoreBusy if they do not all fit"""
+        pending = self._ensure_writer()
+        # Only the writer takes rows off the queue, so once the check passes under the lock every put fits
+        with self._enqueue_lock:
+            if pending.qsize() + len(rows) > self.max_queue:
+                rows_rejected.inc(len(rows))
+                raise StoreBusy('Progress store is busy, retry later')
+            for row in rows:
+                pending.put_nowait((table, row))
+
+    def _write_loop(self, pending: queue.Queue):
+        connection = self._connect()
+        while True:
+            item = pending.get()
+            if item is None:
+                pending.task_done()
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = pending.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write_batch(connection, batch)
+            for _ in range(len(batch) + stop):
+                pending.task_done()
+            if stop:
+                break
+        connection.close()
+
+    def _write_batch(self, connection: sqlite3.Connection, batch: List[Tuple[str, Tuple]]):
+        by_table: Dict[str, List[Tuple]] = {}
+        for table, row in batch:
+            by_table.setdefault(table, []).append(row)
+        for attempt in range(self.write_attempts):
+            try:
+                # A failed transaction is rolled back, so the whole batch can be written again
+                with stage('progress_write'), connection:
+                    for table, rows in by_table.items():
+                        columns = COLUMNS[table]
+                        connection.executemany(
+                            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows
+                        )
+            except sqlite3.Error as e:
+                write_failures.inc()
+                if attempt + 1 < self.write_attempts:
+                    delay = self.retry_backoff * 2 ** attempt
+                    logger.warning(f"Failed to write {len(batch)} progress rows, retrying in {delay:.2f}s: {e}")
+                    time.sleep(delay)
+                    continue
+                logger.error(f"Dropping {len(batch)} progress rows after {self.write_attempts} failed attempts: {e}")
+                for table, rows in by_table.items():
+                    rows_dropped.inc(len(rows), table=table)
+                return
+            for table, rows in by_table.items():
+                rows_written.inc(len(rows), table=table)
+            return
+
+    def flush(self):
+        """Block until every queued row has been committed"""
+        if self._pid == os.getpid():
+            self._queue.join()
+
+    def close(self):
+        """Commit queued rows and stop the writer"""
+        if self._pid == os.getpid() and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+            self._pid = None
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._pid == os.getpid() else 0
+
+    def history(self, table: str, patient_id: str, since: Optional[float] = None, until: Optional[float] = None,
+                limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """A patient's rows in [since, until], newest first"""
+        columns = COLUMNS[table]
+        query = (
+            f"SELECT {', '.join(columns[1:])} FROM {table} "
+            f"WHERE patient_id = ? AND recorded_at >= ? AND recorded_at <= ? ORDER BY recorded_at DESC"
+        )
+        params: List[Any] = [patient_id, since if since is not None else float('-inf'),
+                             until if until is not None else float('inf')]
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+
+        results = []
+        for row in self._reader().execute(query, params):
+            record = dict(row)
+            record['recorded_at'] = format_timestamp(record['recorded_at'])
+            if table == 'sessions':
+                record['completed'] = bool(record['completed'])
+            elif record.get('goals') is not None:
+                record['goals'] = json.loads(record['goals'])
+            results.append(record)
+        return results
+
+    def recent_levels(self, patient_id: str, days: float = PROGRESS_TREND_DAYS) -> Dict[str, Optional[int]]:
+        """The patient's current pain and mobility levels.
+
+        Pain is the rounded mean of the pain reported in assessments and completed sessions over
+        the last `days`, falling back to the latest assessment; mobility is the latest assessment's.
+        """
+        connection = self._reader()
+        since = time.time() - days * 86400
+        latest = connection.execute(
+            "SELECT pain_level, mobility_level FROM assessments WHERE patient_id = ? "
+            "ORDER BY recorded_at DESC LIMIT 1", (patient_id,)
+        ).fetchone()
+        total, count = connection.execute(
+            "SELECT TOTAL(pain_level), COUNT(pain_level) FROM ("
+            " SELECT pain_level FROM assessments WHERE patient_id = ? AND recorded_at >= ?"
+            " UNION ALL"
+            " SELECT pain_level FROM sessions WHERE patient_id = ? AND recorded_at >= ? AND completed = 1)",
+            (patient_id, since, patient_id, since)
+        ).fetchone()
+
+        pain = int(total / count + 0.5) if count else (latest['pain_level'] if latest else None)
+        return {
+            'pain_level': pain,
+            'mobility_level': latest['mobility_level'] if latest else None
+        }
+
+
+_store: Optional[ProgressStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> Optional[ProgressStore]:
+    """The process-wide store, opened on first use, or None when PROGRESS_STORE_ENABLED=0"""
+    global _store
+    if not PROGRESS_STORE_ENABLED:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ProgressStore()
+                atexit.register(close_store)
+    return _store
+
+
+def close_store():
+    """Commit queued rows and stop the writer, if the store was opened"""
+    if _store is not None:
+        _store.close()
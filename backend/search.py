@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Exercise Search Index
+Inverted index with BM25 ranking and prefix completion over exercise names, muscles, equipment and instructions
+"""
+
+import re
+import bisect
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+# Per-field boosts: a term in the name counts three times as much as the same term in the instructions
+SEARCH_FIELD_WEIGHTS = {
+    'name': 3.0,
+    'muscles': 2.0,
+    'equipment': 1.5,
+    'instructions': 1.0
+}
+
+# BM25 term-frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Completions returned for the last, partially typed query term
+MAX_SUGGESTIONS = 5
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def stem(token: str) -> str:
+    """Fold simple plurals so that 'hamstring' finds 'hamstrings' and 'band' finds 'bands'"""
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def _sorted_matrix(ids: Dict[str, int], rows: List[int], cols: List[int], values: np.ndarray,
+                   n_docs: int) -> Tuple[List[str], sparse.csr_matrix]:
+    """Renumber a vocabulary in sorted order, so prefixes map to id ranges, and sum (doc, id) entries"""
+    vocabulary = sorted(ids)
+    remap = np.empty(len(ids), dtype=np.int64)
+    for new_id, key in enumerate(vocabulary):
+        remap[ids[key]] = new_id
+    matrix = sparse.csr_matrix(
+        (values, (np.asarray(rows, dtype=np.int64), remap[np.asarray(cols, dtype=np.int64)])),
+        shape=(n_docs, len(vocabulary))
+    )
+    matrix.sum_duplicates()
+    return vocabulary, matrix
+
+
+def _field_statistics(fields: Dict[str, Sequence[str]], n_docs: int):
+    """Tokenize every field into sorted terms with a (docs x terms) field-weighted term frequency
+    matrix, sorted words with a (docs x words) occurrence matrix, and the weighted document lengths"""
+    term_ids: Dict[str, int] = {}
+    word_ids: Dict[str, int] = {}
+    rows: List[int] = []
+    term_cols: List[int] = []
+    word_cols: List[int] = []
+    weights: List[float] = []
+    doc_lengths = np.zeros(n_docs, dtype=np.float64)
+    for field, texts in fields.items():
+        field_weight = SEARCH_FIELD_WEIGHTS[field]
+        for doc, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc] += field_weight * len(tokens)
+            for token in tokens:
+                rows.append(doc)
+                term_cols.append(term_ids.setdefault(stem(token), len(term_ids)))
+                word_cols.append(word_ids.setdefault(token, len(word_ids)))
+            weights.extend([field_weight] * len(tokens))
+
+    # Duplicate (doc, term) entries are summed into the field-weighted term frequency
+    terms, term_frequency = _sorted_matrix(term_ids, rows, term_cols, np.asarray(weights, dtype=np.float64), n_docs)
+    words, word_frequency = _sorted_matrix(word_ids, rows, word_cols, np.ones(len(rows), dtype=np.int64), n_docs)
+    return terms, term_frequency, words, word_frequency, doc_lengths
+
+
+def _merge_statistics(previous_vocabulary: List[str], previous: sparse.csr_matrix, fresh_vocabulary: List[str],
+                      fresh: sparse.csr_matrix, order: np.ndarray) -> Tuple[List[str], sparse.csr_matrix]:
+    """Stack two (docs x vocabulary) matrices over their merged sorted vocabulary, reorder the rows,
+    and drop entries no document uses any more"""
+    vocabulary = sorted(set(previous_vocabulary).union(fresh_vocabulary))
+    ids = {key: i for i, key in enumerate(vocabulary)}
+    parts = []
+    for part_vocabulary, matrix in ((previous_vocabulary, previous), (fresh_vocabulary, fresh)):
+        # Both vocabularies are sorted, so the remapped column ids stay sorted within each row
+        remap = np.fromiter((ids[key] for key in part_vocabulary), dtype=np.int64, count=len(part_vocabulary))
+        parts.append(sparse.csr_matrix((matrix.data, remap[matrix.indices], matrix.indptr),
+                                       shape=(matrix.shape[0], len(vocabulary))))
+    stacked = sparse.vstack(parts, format='csr')[order]
+
+    used = np.bincount(stacked.indices, minlength=len(vocabulary)) > 0
+    if not used.all():
+        remap = np.cumsum(used) - 1
+        vocabulary = [key for key, keep in zip(vocabulary, used) if keep]
+        stacked = sparse.csr_matrix((stacked.data, remap[stacked.indices], stacked.indptr),
+                                    shape=(stacked.shape[0], len(vocabulary)))
+    return vocabulary, stacked
+
+
+@dataclass
+class SearchResult:
+    positions: np.ndarray
+    scores: np.ndarray
+    total: int
+    suggestions: List[str]
+
+
+class SearchIndex:
+    """BM25F-style inverted index over a fixed set of catalog positions.
+
+    Field term frequencies are combined with SEARCH_FIELD_WEIGHTS before BM25 saturation, and the
+    per-(term, document) scores are computed once at build time, so a query only sums postings.
+    Terms get ids in sorted order: every term sharing a prefix occupies one contiguous id range,
+    found by bisecting the vocabulary, and its postings are one contiguous slice. This serves as
+    the prefix trie for autocomplete without a node per character.
+
+    Terms are indexed with plurals folded (see `stem`). Every query term must match. Unless the
+    query ends with whitespace, its last term is treated as a prefix and each document scores its
+    best completion; suggestions complete it against the unstemmed words, most frequent first.
+    """
+
+    def __init__(self, positions: np.ndarray, fields: Dict[str, Sequence[str]]):
+        self._build(positions, *_field_statistics(fields, len(positions)))
+
+    def _build(self, positions: np.ndarray, terms: List[str], term_frequency: sparse.csr_matrix,
+               words: List[str], word_frequency: sparse.csr_matrix, doc_lengths: np.ndarray):
+        """Compute BM25 postings from per-document statistics, which are kept for `updated`"""
+        self.positions = np.asarray(positions, dtype=np.int64)
+        n_docs = len(self.positions)
+        self._term_frequency = term_frequency
+        self._word_frequency = word_frequency
+        self._doc_lengths = doc_lengths
+
+        self.words = words
+        self.word_counts = np.asarray(word_frequency.sum(axis=0), dtype=np.int64).ravel()
+        self.terms = terms
+        self._term_ids = {term: term_id for term_id, term in enumerate(self.terms)}
+
+        postings = term_frequency.tocsc()
+        postings.sort_indices()
+        self.document_frequency = np.diff(postings.indptr)
+
+        idf = np.log1p((n_docs - self.document_frequency + 0.5) / (self.document_frequency + 0.5))
+        average_length = doc_lengths.mean() if n_docs and doc_lengths.mean() > 0 else 1.0
+        norms = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths / average_length)
+        tf = postings.data
+        term_of_posting = np.repeat(np.arange(len(self.terms)), self.document_frequency)
+        self._indptr = postings.indptr
+        self._rows = postings.indices
+        self._weights = idf[term_of_posting] * tf * (BM25_K1 + 1) / (tf + norms[postings.indices])
+
+        logger.info(f"Built search index over {n_docs} exercises and {len(self.terms)} terms")
+
+    @staticmethod
+    def _store_fields(store, positions: np.ndarray) -> Dict[str, List[str]]:
+        exercises = [store[int(position)] for position in positions]
+        return {
+            'name': [ex.name for ex in exercises],
+            'muscles': [' '.join(ex.primaryMuscles + ex.secondaryMuscles) for ex in exercises],
+            'equipment': [ex.equipment or '' for ex in exercises],
+            'instructions': [' '.join(ex.instructions) for ex in exercises]
+        }
+
+    @classmethod
+    def from_store(cls, store, positions: np.ndarray) -> 'SearchIndex':
+        """Index the searchable fields of the given store positions"""
+        return cls(positions, cls._store_fields(store, positions))
+
+    @classmethod
+    def updated(cls, previous: 'SearchIndex', store, positions: np.ndarray,
+                previous_rows: np.ndarray) -> 'SearchIndex':
+        """Index the given store positions, tokenizing only documents `previous` did not index.
+
+        `previous_rows` maps each row of `store` to its row in the catalog `previous` was built
+        from, or -1 for added and changed rows. Term statistics of the other documents are copied;
+        IDF, length normalization and postings are recomputed over the whole set, so the result is
+        identical to `from_store`.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        doc_of_row = np.full(int(previous.positions.max()) + 1 if len(previous.positions) else 0, -1, dtype=np.int64)
+        doc_of_row[previous.positions] = np.arange(len(previous.positions))
+        rows = previous_rows[positions] if len(positions) else np.empty(0, dtype=np.int64)
+        known = (rows >= 0) & (rows < len(doc_of_row))
+        reused = np.where(known, doc_of_row[np.where(known, rows, 0)], -1)
+
+        fresh = np.flatnonzero(reused < 0)
+        kept = np.flatnonzero(reused >= 0)
+        fresh_terms, fresh_term_frequency, fresh_words, fresh_word_frequency, fresh_lengths = _field_statistics(
+            cls._store_fields(store, positions[fresh]), len(fresh))
+
+        # Rows of the stacked statistics, in document order
+        order = np.empty(len(positions), dtype=np.int64)
+        order[kept] = np.arange(len(kept))
+        order[fresh] = len(kept) + np.arange(len(fresh))
+
+        terms, term_frequency = _merge_statistics(
+            previous.terms, previous._term_frequency[reused[kept]], fresh_terms, fresh_term_frequency, order)
+        words, word_frequency = _merge_statistics(
+            previous.words, previous._word_frequency[reused[kept]], fresh_words, fresh_word_frequency, order)
+        doc_lengths = np.concatenate([previous._doc_lengths[reused[kept]], fresh_lengths])[order]
+
+        index = cls.__new__(cls)
+        index._build(positions, terms, term_frequency, words, word_frequency, doc_lengths)
+        return index
+
+    @staticmethod
+    def _prefix_range(vocabulary: List[str], prefix: str) -> Tuple[int, int]:
+        start = bisect.bisect_left(vocabulary, prefix)
+        end = bisect.bisect_left(vocabulary, prefix + '\uffff', start)
+        return start, end
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """Ids [start, end) of every indexed term starting with prefix, retried with its plural folded"""
+        start, end = self._prefix_range(self.terms, prefix)
+        if start == end and stem(prefix) != prefix:
+            start, end = self._prefix_range(self.terms, stem(prefix))
+        return start, end
+
+    def complete(self, prefix: str, limit: int = MAX_SUGGESTIONS) -> List[str]:
+        """Words starting with prefix, most frequent first"""
+        start, end = self._prefix_range(self.words, prefix)
+        if start == end:
+            return []
+        order = np.argsort(-self.word_counts[start:end], kind='stable')[:limit]
+        return [self.words[start + i] for i in order]
+
+    def _term_scores(self, start: int, end: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Documents containing any term in [start, end) and their best BM25 score among those terms"""
+        lo, hi = self._indptr[start], self._indptr[end]
+        if end - start == 1:
+            return self._rows[lo:hi], self._weights[lo:hi]
+        best = np.zeros(len(self.positions), dtype=np.float64)
+        np.maximum.at(best, self._rows[lo:hi], self._weights[lo:hi])
+        docs = np.flatnonzero(best)
+        return docs, best[docs]
+
+    def search(self, query: str, limit: Optional[int] = 20, offset: int = 0,
+               allowed: Optional[np.ndarray] = None) -> SearchResult:
+        """Rank positions matching every query term by BM25 score, ties in catalog order.
+
+        `allowed` optionally restricts results to a subset of catalog positions.
+        """
+        tokens = tokenize(query)
+        prefix = tokens.pop() if tokens and not query[-1:].isspace() else None
+        suggestions = self.complete(prefix) if prefix is not None else []
+
+        ranges = []
+        for token in dict.fromkeys(stem(token) for token in tokens):
+            term_id = self._term_ids.get(token)
+            if term_id is None:
+                return SearchResult(np.empty(0, dtype=np.int64), np.empty(0), 0, suggestions)
+            ranges.append((term_id, term_id + 1))
+        if prefix is not None:
+            start, end = self.prefix_range(prefix)
+            if start == end:
+                return SearchResult(np.empty(0, dtype=np.int64), np.empty(0), 0, suggestions)
+            ranges.append((start, end))
+        if not ranges:
+            return SearchResult(np.empty(0, dtype=np.int64), np.empty(0), 0, suggestions)
+
+        scores = np.zeros(len(self.positions), dtype=np.float64)
+        matched = np.zeros(len(self.positions), dtype=np.int32)
+        for start, end in ranges:
+            docs, term_scores = self._term_scores(start, end)
+            scores[docs] += term_scores
+            matched[docs] += 1
+
+        docs = np.flatnonzero(matched == len(ranges))
+        if allowed is not None:
+            docs = docs[np.isin(self.positions[docs], allowed)]
+        order = docs[np.argsort(-scores[docs], kind='stable')]
+        page = order[offset:] if limit is None else order[offset:offset + limit]
+        return SearchResult(self.positions[page], scores[page], len(order), suggestions)
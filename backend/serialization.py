@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+JSON Serialization Helpers
+Encodes response bodies as bytes, splicing in pre-encoded fragments and using orjson when it is installed
+"""
+
+import json
+from dataclasses import asdict
+from typing import Any, Dict, Iterable
+
+try:
+    import orjson
+except ImportError:  # optional fast backend
+    orjson = None
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode a JSON-serializable object to compact UTF-8 bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def encode_record(obj: Any) -> bytes:
+    """Encode a dataclass instance, or a view exposing to_dict(), exactly as asdict() would shape it"""
+    to_dict = getattr(obj, 'to_dict', None)
+    return dumps(to_dict() if to_dict is not None else asdict(obj))
+
+
+def encode_array(fragments: Iterable[bytes]) -> bytes:
+    """Splice already-encoded JSON values into a JSON array"""
+    return b'[' + b','.join(fragments) + b']'
+
+
+def encode_object(raw_fields: Dict[str, bytes], fields: Dict[str, Any] = None) -> bytes:
+    """Encode a JSON object whose raw_fields values are already-encoded JSON and whose fields still need encoding"""
+    parts = [dumps(key) + b':' + value for key, value in raw_fields.items()]
+    if fields:
+        encoded = dumps(fields)
+        if len(encoded) > 2:
+            parts.append(encoded[1:-1])
+    return b'{' + b','.join(parts) + b'}'
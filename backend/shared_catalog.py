@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Shared Catalog Artifacts
+Writes the serialized exercises, TF-IDF matrix, similarity postings and fitted vocabulary to flat files that every
+worker process memory-maps read-only, so N workers share one copy of the pages instead of N
+"""
+
+import os
+import json
+import time
+import pickle
+import shutil
+import logging
+import tempfile
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from scipy import sparse
+
+from similarity import SimilarityIndex
+
+logger = logging.getLogger(__name__)
+
+# Bump when the on-disk layout or the encoding of any artifact changes
+SHARED_FORMAT_VERSION = 2
+
+# File in the shared directory naming the catalog version every worker should serve
+PUBLISHED_VERSION_FILE = 'published.json'
+
+
+class MappedFragments(Sequence):
+    """Read-only sequence of pre-encoded JSON fragments stored back to back in one buffer"""
+
+    def __init__(self, buffer: np.ndarray, offsets: np.ndarray):
+        self._buffer = buffer
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('fragment index out of range')
+        return self._buffer[self._offsets[i]:self._offsets[i + 1]].tobytes()
+
+
+@dataclass
+class SharedCatalog:
+    fragments: MappedFragments
+    vectors: sparse.csr_matrix
+    similarity_index: SimilarityIndex
+    vectorizer: Any
+    vocabulary: Dict[str, Any]  # terms, token_count and drift of the fitted TF-IDF corpus
+
+
+def artifact_dir(root: str, catalog_version: str, max_postings: int) -> str:
+    return os.path.join(root, f'{catalog_version}-v{SHARED_FORMAT_VERSION}-p{max_postings or 0}')
+
+
+def export_shared_catalog(root: str, catalog_version: str, fragments: List[bytes],
+                          vectors: sparse.spmatrix, similarity_index: SimilarityIndex,
+                          vectorizer: Any, vocabulary: Dict[str, Any]) -> str:
+    """Write the artifacts for one catalog version, atomically, and return their directory"""
+    target = artifact_dir(root, catalog_version, similarity_index.max_postings)
+    if os.path.isdir(target):
+        return target
+
+    os.makedirs(root, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=root, prefix='.staging-')
+    try:
+        offsets = np.zeros(len(fragments) + 1, dtype=np.int64)
+        with open(os.path.join(staging, 'fragments.bin'), 'wb') as f:
+            for i, fragment in enumerate(fragments):
+                f.write(fragment)
+                offsets[i + 1] = offsets[i] + len(fragment)
+        np.save(os.path.join(staging, 'fragment_offsets.npy'), offsets)
+
+        vectors = sparse.csr_matrix(vectors)
+        np.save(os.path.join(staging, 'vectors_data.npy'), vectors.data)
+        np.save(os.path.join(staging, 'vectors_indices.npy'), vectors.indices)
+        np.save(os.path.join(staging, 'vectors_indptr.npy'), vectors.indptr)
+
+        postings_indptr, postings_rows, postings_weights = similarity_index.postings
+        np.save(os.path.join(staging, 'postings_indptr.npy'), np.asarray(postings_indptr))
+        np.save(os.path.join(staging, 'postings_rows.npy'), np.asarray(postings_rows))
+        np.save(os.path.join(staging, 'postings_weights.npy'), np.asarray(postings_weights))
+
+        with open(os.path.join(staging, 'vectorizer.pkl'), 'wb') as f:
+            pickle.dump(vectorizer, f)
+
+        with open(os.path.join(staging, 'vocabulary.json'), 'w') as f:
+            json.dump({**vocabulary, 'terms': sorted(vocabulary['terms'])}, f)
+
+        with open(os.path.join(staging, 'meta.json'), 'w') as f:
+            json.dump({
+                'catalog_version': catalog_version,
+                'format_version': SHARED_FORMAT_VERSION,
+                'exercises': len(fragments),
+                'vectors_shape': list(vectors.shape),
+                'max_postings': similarity_index.max_postings
+            }, f)
+
+        try:
+            os.rename(staging, target)
+        except OSError:
+            # Another process published the same version first
+            if not os.path.isdir(target):
+                raise
+            shutil.rmtree(staging, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    logger.info(f"Exported shared catalog artifacts to {target}")
+    return target
+
+
+def load_shared_catalog(root: str, catalog_version: str, max_postings: int) -> Optional[SharedCatalog]:
+    """Memory-map the artifacts for a catalog version, or return None if they have not been exported"""
+    directory = artifact_dir(root, catalog_version, max_postings)
+    meta_path = os.path.join(directory, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+
+    def mapped(name: str) -> np.ndarray:
+        return np.load(os.path.join(directory, name), mmap_mode='r')
+
+    fragments_path = os.path.join(directory, 'fragments.bin')
+    if os.path.getsize(fragments_path):
+        buffer = np.memmap(fragments_path, dtype=np.uint8, mode='r')
+    else:
+        buffer = np.empty(0, dtype=np.uint8)
+
+    vectors = sparse.csr_matrix(
+        (mapped('vectors_data.npy'), mapped('vectors_indices.npy'), mapped('vectors_indptr.npy')),
+        shape=tuple(meta['vectors_shape']),
+        copy=False
+    )
+
+    similarity_index = SimilarityIndex.from_postings(
+        mapped('postings_indptr.npy'),
+        mapped('postings_rows.npy'),
+        mapped('postings_weights.npy'),
+        n_rows=meta['vectors_shape'][0],
+        max_postings=meta['max_postings']
+    )
+
+    with open(os.path.join(directory, 'vectorizer.pkl'), 'rb') as f:
+        vectorizer = pickle.load(f)
+
+    with open(os.path.join(directory, 'vocabulary.json')) as f:
+        vocabulary = json.load(f)
+
+    logger.info(f"Attached shared catalog artifacts from {directory}")
+    return SharedCatalog(
+        fragments=MappedFragments(buffer, mapped('fragment_offsets.npy')),
+        vectors=vectors,
+        similarity_index=similarity_index,
+        vectorizer=vectorizer,
+        vocabulary=vocabulary
+    )
+
+
+def publish_version(root: str, catalog_version: str):
+    """Record catalog_version as the one every worker sharing root should serve"""
+    os.makedirs(root, exist_ok=True)
+    fd, staging = tempfile.mkstemp(dir=root, prefix='.published-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'catalog_version': catalog_version, 'published_at': time.time()}, f)
+        os.replace(staging, os.path.join(root, PUBLISHED_VERSION_FILE))
+    except Exception:
+        if os.path.exists(staging):
+            os.remove(staging)
+        raise
+
+
+def published_version(root: str) -> Optional[str]:
+    """The catalog version last published to root, or None if there is none"""
+    try:
+        with open(os.path.join(root, PUBLISHED_VERSION_FILE)) as f:
+            return json.load(f).get('catalog_version')
+    except (OSError, ValueError):
+        return None
+
+
+def prune_artifacts(root: str, keep: int) -> List[str]:
+    """Delete all but the `keep` most recently written artifact directories, never the published version's.
+
+    Processes still serving a deleted version keep working: their mappings hold the files open.
+    Returns the deleted directories.
+    """
+    try:
+        names = [name for name in os.listdir(root)
+                 if not name.startswith('.') and os.path.isdir(os.path.join(root, name))]
+    except FileNotFoundError:
+        return []
+
+    published = published_version(root)
+    names.sort(key=lambda name: os.path.getmtime(os.path.join(root, name)), reverse=True)
+    removed = []
+    for name in names[max(keep, 0):]:
+        if published is not None and name.startswith(f'{published}-'):
+            continue
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        removed.append(name)
+    if removed:
+        logger.info(f"Deleted {len(removed)} old shared catalog versions from {root}")
+    return removed
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Similarity Index
+Term-postings index over the TF-IDF exercise matrix for cosine similarity against short query texts
+"""
+
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+
+class SimilarityIndex:
+    """Scores a query only against the rows that share a term with it.
+
+    Each vocabulary term keeps a postings list of (row, weight) pairs taken from the column of the
+    L2-normalized TF-IDF matrix, so a query costs time proportional to the postings of its terms
+    rather than to the catalog size. With max_postings set, each list keeps only its highest
+    weights, which makes similarities approximate but bounds the work per query term.
+    """
+
+    def __init__(self, matrix: sparse.spmatrix, max_postings: Optional[int] = None):
+        csc = sparse.csc_matrix(matrix)
+        self.n_rows, self.n_terms = csc.shape
+        self.max_postings = max_postings or None
+
+        if self.max_postings is None:
+            self._indptr = csc.indptr
+            self._rows = csc.indices
+            self._weights = csc.data
+        else:
+            indptr = [0]
+            rows = []
+            weights = []
+            for term in range(self.n_terms):
+                start, end = csc.indptr[term], csc.indptr[term + 1]
+                term_rows = csc.indices[start:end]
+                term_weights = csc.data[start:end]
+                if len(term_weights) > self.max_postings:
+                    keep = np.argpartition(-term_weights, self.max_postings - 1)[:self.max_postings]
+                    keep.sort()
+                    term_rows = term_rows[keep]
+                    term_weights = term_weights[keep]
+                rows.append(term_rows)
+                weights.append(term_weights)
+                indptr.append(indptr[-1] + len(term_rows))
+            self._indptr = np.asarray(indptr, dtype=np.int64)
+            self._rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int32)
+            self._weights = np.concatenate(weights) if weights else np.empty(0, dtype=np.float64)
+
+        logger.info(
+            f"Built similarity index over {self.n_rows} rows and {self.n_terms} terms "
+            f"({'exact' if self.max_postings is None else f'top {self.max_postings} postings per term'})"
+        )
+
+    @classmethod
+    def from_postings(cls, indptr: np.ndarray, rows: np.ndarray, weights: np.ndarray,
+                      n_rows: int, max_postings: Optional[int] = None) -> 'SimilarityIndex':
+        """Rebuild an index from arrays previously taken from `postings`, e.g. memory-mapped from disk"""
+        index = cls.__new__(cls)
+        index.n_rows = n_rows
+        index.n_terms = len(indptr) - 1
+        index.max_postings = max_postings or None
+        index._indptr = indptr
+        index._rows = rows
+        index._weights = weights
+        return index
+
+    @property
+    def postings(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(indptr, rows, weights) arrays backing the index"""
+        return self._indptr, self._rows, self._weights
+
+    def scores(self, query: sparse.spmatrix) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, similarities) for every row sharing at least one term with the 1 x terms query"""
+        query = sparse.csr_matrix(query)
+        if query.nnz == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float64)
+
+        rows = []
+        contributions = []
+        for term, query_weight in zip(query.indices, query.data):
+            start, end = self._indptr[term], self._indptr[term + 1]
+            rows.append(self._rows[start:end])
+            contributions.append(self._weights[start:end] * query_weight)
+
+        rows = np.concatenate(rows)
+        unique_rows, inverse = np.unique(rows, return_inverse=True)
+        return unique_rows.astype(np.intp), np.bincount(inverse, weights=np.concatenate(contributions))
+
+    def dense_scores(self, query: sparse.spmatrix) -> np.ndarray:
+        """Similarity for every row, zero for rows without a shared term"""
+        similarity = np.zeros(self.n_rows, dtype=np.float64)
+        rows, values = self.scores(query)
+        similarity[rows] = values
+        return similarity
@@ -30,6 +30,12 @@ source venv/bin/activate
 echo "📚 Installing dependencies..."
 pip install -r requirements.txt
 
+# Create the local exercise catalog snapshot on first run
+if [ ! -f "${EXERCISE_CATALOG_PATH:-data/exercises_snapshot.json}" ]; then
+    echo "📥 Downloading exercise catalog snapshot..."
+    python catalog.py refresh || exit 1
+fi
+
 # Start the Flask application
 echo "🚀 Starting Flask application on http://localhost:5001"
 echo "📊 Health check available at: http://localhost:5001/health"
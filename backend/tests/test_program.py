@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='module')
+def engine(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp('catalog')
+    snapshot_path = str(workdir / 'exercises_snapshot.json')
+
+    from benchmark import build_fixture_catalog
+    from catalog import save_snapshot
+    save_snapshot(build_fixture_catalog(), snapshot_path, source='test-fixture')
+
+    # Importing app builds its own engine and reads its settings from the environment: point it
+    # at the fixture, keep it off the signal handlers and shared state, and restore everything after
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv('EXERCISE_CATALOG_PATH', snapshot_path)
+        monkeypatch.setenv('PROGRESS_DB_PATH', str(workdir / 'progress.db'))
+        monkeypatch.setenv('CATALOG_RELOAD_SIGNAL', 'none')
+        for name in ('SHARED_CATALOG_DIR', 'PROGRESS_STORE_ENABLED', 'RECOMMENDATION_CACHE_WARM_CONDITIONS',
+                     'PROGRAM_DIVERSITY'):
+            monkeypatch.delenv(name, raising=False)
+
+        import app
+        yield app.ExerciseRecommendationEngine(snapshot_path=snapshot_path)
+
+
+@pytest.mark.parametrize('pain_level', [8, 9, 10])
+def test_high_pain_program_days_differ(engine, pain_level):
+    import app
+    user = app.UserProfile(pain_level=pain_level, mobility_level=4, condition='back pain', goals=[])
+    days = engine.build_program(user, days=4, exercises_per_day=5, stretches_per_day=0)
+
+    ids = [[recommendation.exercise.id for recommendation in day.exercises] for day in days]
+    assert all(ids)
+    for previous, current in zip(ids, ids[1:]):
+        assert previous != current
+    assert len({exercise_id for day in ids for exercise_id in day}) > len(ids[0])
+    assert all(day.intensity_load <= day.intensity_budget for day in days)
@@ -13,100 +13,82 @@ interface ExerciseLibraryProps {
   onBack: () => void;
 }
 
+// Values the backend's PT-relevant catalog can contain, offered as server-side filters
+const CATEGORY_OPTIONS = ['cardio', 'olympic weightlifting', 'plyometrics', 'powerlifting', 'stretching', 'strength', 'strongman'];
+const EQUIPMENT_OPTIONS = [
+  'barbell', 'body only', 'cable', 'dumbbell', 'e-z curl bar', 'foam roll', 'kettlebell',
+  'medicine ball', 'other', 'resistance band', 'stability ball'
+];
+
 export function ExerciseLibrary({ onSelectExercise, onBack }: ExerciseLibraryProps) {
   const [exercises, setExercises] = useState<ExternalExercise[]>([]);
-  const [filteredExercises, setFilteredExercises] = useState<ExternalExercise[]>([]);
+  const [totalExercises, setTotalExercises] = useState(0);
   const [loading, setLoading] = useState(true);
+  const [hasLoaded, setHasLoaded] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [filters, setFilters] = useState<ExerciseFilters>({});
   const [currentPage, setCurrentPage] = useState(1);
   const [showFilters, setShowFilters] = useState(false);
+  const [reloadCount, setReloadCount] = useState(0);
   
   const exercisesPerPage = 12;
-  const totalPages = Math.ceil(filteredExercises.length / exercisesPerPage);
-  const startIndex = (currentPage - 1) * exercisesPerPage;
-  const endIndex = startIndex + exercisesPerPage;
-  const currentExercises = filteredExercises.slice(startIndex, endIndex);
-
-  useEffect(() => {
-    loadExercises();
-  }, []);
+  const totalPages = Math.ceil(totalExercises / exercisesPerPage);
 
   useEffect(() => {
-    applyFilters();
-  }, [exercises, filters]);
-
-  const loadExercises = async () => {
-    try {
-      setLoading(true);
-      setError(null);
-      
-      console.log('🔄 Loading exercises from Python backend...');
-      const allExercises = await pythonBackendService.getAllExercises();
-      console.log('✅ Loaded', allExercises.length, 'exercises from Python backend');
-      
-      setExercises(allExercises);
-      setFilteredExercises(allExercises);
-    } catch (err) {
-      console.error('❌ Error loading exercises:', err);
-      setError('Failed to load exercises. Please make sure the Python backend is running.');
-    } finally {
-      setLoading(false);
-    }
-  };
+    // Only the latest request may update the page: an older one can resolve after it
+    let cancelled = false;
 
-  const applyFilters = () => {
-    try {
-      let filtered = [...exercises];
-      
-      // Apply search term filter
-      if (filters.searchTerm) {
-        const searchTerm = filters.searchTerm.toLowerCase();
-        filtered = filtered.filter(exercise => 
-          exercise.name.toLowerCase().includes(searchTerm) ||
-          exercise.category?.toLowerCase().includes(searchTerm) ||
-          exercise.primaryMuscles.some(muscle => muscle.toLowerCase().includes(searchTerm)) ||
-          exercise.instructions.some(instruction => instruction.toLowerCase().includes(searchTerm))
-        );
+    const loadExercises = async () => {
+      try {
+        setLoading(true);
+        setError(null);
+        
+        const query = {
+          category: filters.category,
+          level: filters.level,
+          equipment: filters.equipment,
+          offset: (currentPage - 1) * exercisesPerPage,
+          limit: exercisesPerPage
+        };
+        const searchTerm = filters.searchTerm?.trim();
+        const page = searchTerm
+          ? await pythonBackendService.searchExercises(searchTerm, query)
+          : await pythonBackendService.getExercisesPage(query);
+        
+        if (!cancelled) {
+          setExercises(page.exercises);
+          setTotalExercises(page.total);
+          setHasLoaded(true);
+        }
+      } catch (err) {
+        console.error('❌ Error loading exercises:', err);
+        if (!cancelled) {
+          setError('Failed to load exercises. Please make sure the Python backend is running.');
+        }
+      } finally {
+        if (!cancelled) {
+          setLoading(false);
+        }
       }
-      
-      // Apply category filter
-      if (filters.category) {
-        filtered = filtered.filter(exercise => 
-          exercise.category?.toLowerCase() === filters.category?.toLowerCase()
-        );
-      }
-      
-      // Apply level filter
-      if (filters.level) {
-        filtered = filtered.filter(exercise => 
-          exercise.level === filters.level
-        );
-      }
-      
-      // Apply equipment filter
-      if (filters.equipment) {
-        filtered = filtered.filter(exercise => 
-          exercise.equipment?.toLowerCase() === filters.equipment?.toLowerCase()
-        );
-      }
-      
-      setFilteredExercises(filtered);
-      setCurrentPage(1); // Reset to first page when filters change
-    } catch (err) {
-      console.error('Error applying filters:', err);
-    }
-  };
+    };
+
+    loadExercises();
+    return () => {
+      cancelled = true;
+    };
+  }, [filters, currentPage, reloadCount]);
 
   const handleFilterChange = (key: keyof ExerciseFilters, value: any) => {
     setFilters(prev => ({
       ...prev,
       [key]: value
     }));
+    setCurrentPage(1); // Reset to first page when filters change
   };
 
   const clearFilters = () => {
     setFilters({});
+    setCurrentPage(1);
   };
 
   const convertToAppExercise = (externalExercise: ExternalExercise): Exercise => {
@@ -136,7 +118,8 @@ export function ExerciseLibrary({ onSelectExercise, onBack }: ExerciseLibraryPro
     return 'bg-gray-100 text-gray-800';
   };
 
-  if (loading) {
+  // Later pages and searches keep the current grid (and the search box focus) while they load
+  if (loading && !hasLoaded) {
     return (
       <div className="min-h-screen bg-gray-50 p-6">
         <div className="max-w-7xl mx-auto">
@@ -158,7 +141,7 @@ export function ExerciseLibrary({ onSelectExercise, onBack }: ExerciseLibraryPro
           <div className="flex items-center justify-center h-64">
             <div className="text-center">
               <p className="text-red-600 mb-4">{error}</p>
-              <Button onClick={loadExercises}>Try Again</Button>
+              <Button onClick={() => setReloadCount(count => count + 1)}>Try Again</Button>
             </div>
           </div>
         </div>
@@ -189,7 +172,7 @@ export function ExerciseLibrary({ onSelectExercise, onBack }: ExerciseLibraryPro
           </div>
           
           <p className="text-gray-600">
-            Browse {filteredExercises.length} physical therapy exercises from our comprehensive library
+            Browse {totalExercises} physical therapy exercises from our comprehensive library
           </p>
         </div>
 
@@ -228,7 +211,7 @@ export function ExerciseLibrary({ onSelectExercise, onBack }: ExerciseLibraryPro
                     </SelectTrigger>
                     <SelectContent>
                       <SelectItem value="">All categories</SelectItem>
-                      {exerciseService.getUniqueCategories(exercises).map(category => (
+                      {CATEGORY_OPTIONS.map(category => (
                         <SelectItem key={category} value={category}>
                           {category.charAt(0).toUpperCase() + category.slice(1)}
                         </SelectItem>
@@ -267,7 +250,7 @@ export function ExerciseLibrary({ onSelectExercise, onBack }: ExerciseLibraryPro
                     </SelectTrigger>
                     <SelectContent>
                       <SelectItem value="">All equipment</SelectItem>
-                      {exerciseService.getUniqueEquipment(exercises).map(equipment => (
+                      {EQUIPMENT_OPTIONS.map(equipment => (
                         <SelectItem key={equipment} value={equipment}>
                           {equipment.charAt(0).toUpperCase() + equipment.slice(1)}
                         </SelectItem>
@@ -282,7 +265,7 @@ export function ExerciseLibrary({ onSelectExercise, onBack }: ExerciseLibraryPro
 
         {/* Exercise Grid */}
         <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 xl:grid-cols-4 gap-6 mb-8">
-          {currentExercises.map((exercise) => (
+          {exercises.map((exercise) => (
             <Card key={exercise.id} className="hover:shadow-lg transition-shadow cursor-pointer">
               <CardHeader className="pb-3">
                 <div className="flex items-start justify-between">
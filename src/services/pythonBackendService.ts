@@ -38,6 +38,23 @@ export interface ExerciseFilters {
   searchTerm?: string;
 }
 
+export interface ExerciseQuery {
+  category?: string;
+  equipment?: string;
+  level?: string;
+  muscle?: string;
+  offset?: number;
+  limit?: number;
+}
+
+export interface ExercisePage {
+  exercises: ExternalExercise[];
+  total: number;
+  offset: number;
+  limit: number | null;
+  next_offset: number | null;
+}
+
 class PythonBackendService {
   private baseUrl = 'http://localhost:5001';
 
@@ -133,6 +150,53 @@ class PythonBackendService {
     }
   }
 
+  private queryParams(query: ExerciseQuery): URLSearchParams {
+    const params = new URLSearchParams();
+    Object.entries(query).forEach(([key, value]) => {
+      if (value !== undefined && value !== '') {
+        params.append(key, String(value));
+      }
+    });
+    return params;
+  }
+
+  // Pages carry an ETag with Cache-Control: no-cache, so the browser cache revalidates them
+  // with If-None-Match and an unchanged page comes back as a body-less 304
+  async getExercisesPage(query: ExerciseQuery = {}): Promise<ExercisePage> {
+    try {
+      const response = await fetch(`${this.baseUrl}/exercises?${this.queryParams(query).toString()}`);
+      if (!response.ok) {
+        throw new Error(`Failed to fetch exercises: ${response.statusText}`);
+      }
+      return await response.json();
+    } catch (error) {
+      console.error('Failed to get exercises page:', error);
+      throw error;
+    }
+  }
+
+  async searchExercises(searchTerm: string, query: ExerciseQuery = {}): Promise<ExercisePage> {
+    try {
+      const params = this.queryParams(query);
+      params.append('q', searchTerm);
+      const response = await fetch(`${this.baseUrl}/search?${params.toString()}`);
+      if (!response.ok) {
+        throw new Error(`Failed to search exercises: ${response.statusText}`);
+      }
+      const data = await response.json();
+      return {
+        exercises: data.results.map((result: { exercise: ExternalExercise }) => result.exercise),
+        total: data.total,
+        offset: data.offset,
+        limit: data.limit,
+        next_offset: data.next_offset
+      };
+    } catch (error) {
+      console.error('Failed to search exercises:', error);
+      throw error;
+    }
+  }
+
   convertToAppExercise(externalExercise: ExternalExercise): Exercise {
     return {
       id: externalExercise.id,